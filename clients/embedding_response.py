@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : embedding_response
+# @Software: PyCharm
+import base64
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+import numpy as np
+
+
+@dataclass
+class EmbeddingArrayResponse:
+    # (len(input), dimension) 的 float32 矩阵，行顺序与输入一致
+    embeddings: np.ndarray
+    total_tokens: Optional[int] = None
+
+
+def decode_embedding_response(content: bytes) -> EmbeddingArrayResponse:
+    """
+    解析 OpenAI 兼容的嵌入响应，embedding 为 base64（小端 float32）时直接拼接字节转为矩阵，
+    不经过 JSON 浮点数组和 pydantic 校验
+    """
+    body = json.loads(content)
+    data = sorted(body['data'], key=lambda item: item['index'])
+    usage = body.get('usage') or {}
+    if not data:
+        return EmbeddingArrayResponse(np.zeros((0, 0), dtype=np.float32), usage.get('total_tokens'))
+    if isinstance(data[0]['embedding'], str):
+        buffer = b''.join(base64.b64decode(item['embedding']) for item in data)
+        embeddings = np.frombuffer(buffer, dtype='<f4').reshape(len(data), -1)
+    else:
+        embeddings = np.array([item['embedding'] for item in data], dtype=np.float32)
+    return EmbeddingArrayResponse(embeddings, usage.get('total_tokens'))
+
+
+async def create_openai_embeddings(client, input: Union[str, List[str]], model: str) -> EmbeddingArrayResponse:
+    """client 为 openai.AsyncClient，使用 base64 传输并读取原始响应"""
+    response = await client.embeddings.with_raw_response.create(input=input, model=model, encoding_format='base64')
+    return decode_embedding_response(response.http_response.content)
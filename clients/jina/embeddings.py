@@ -9,6 +9,7 @@ from typing import Union, List, Iterable, Optional
 
 from openai.types import CreateEmbeddingResponse
 
+from clients.embedding_response import EmbeddingArrayResponse, decode_embedding_response
 from .client import AsyncClient
 
 
@@ -44,4 +45,29 @@ class AsyncEmbeddings:
             '/embeddings', json=request_json,
             headers={'Authorization': f'Bearer {self.client.api_key}'}
         )
+        response.raise_for_status()
         return CreateEmbeddingResponse.model_validate(response.json())
+
+    async def create_array(
+            self,
+            input: Union[str, List[str]],
+            model: str = 'jina-embeddings-v2-base-code',
+            task: Optional[str] = None,
+            dimensions: Optional[int] = None,
+    ) -> EmbeddingArrayResponse:
+        """以 base64 传输，直接解码为 float32 矩阵"""
+        request_json = {
+            'input': input,
+            'model': model,
+            'embedding_type': 'base64'
+        }
+        if task:
+            request_json['task'] = task
+        if dimensions:
+            request_json['dimensions'] = dimensions
+        response = await self.client.post(
+            '/embeddings', json=request_json,
+            headers={'Authorization': f'Bearer {self.client.api_key}'}
+        )
+        response.raise_for_status()
+        return decode_embedding_response(response.content)
@@ -23,6 +23,10 @@ class Constants:
         TEMP_PATH: str = '/tmp'
         QDRANT_DEFAULT_DISK_PATH: str = os.path.join(ROOT_PATH, 'vector', 'qdrant')
         CHROMA_DEFAULT_DISK_PATH: str = os.path.join(ROOT_PATH, 'vector', 'chroma')
+        STORAGE_PATH: str = os.path.join(ROOT_PATH, 'storage')
+        STATE_DEFAULT_PATH: str = os.path.join(STORAGE_PATH, 'we0_index.db')
+        MIRROR_DEFAULT_PATH: str = os.path.join(STORAGE_PATH, 'mirrors')
+        EMBEDDING_CACHE_DEFAULT_PATH: str = os.path.join(STORAGE_PATH, 'embedding_cache.db')
 
         # We0 CONFIG
         load_dotenv(ENV_FILE_PATH)
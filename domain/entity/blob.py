@@ -7,19 +7,20 @@
 # @Software: PyCharm
 import asyncio
 from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
 from io import BytesIO
 from pathlib import PurePath
 from typing import Dict, Any, Generator, BinaryIO
 
 import aiofiles
-from pydantic import Field, model_validator, ConfigDict, BaseModel
 
 
-class Blob(BaseModel):
+@dataclass(frozen=True, slots=True)
+class Blob:
     id: str | None = None
     filename: str | None = None
 
-    meta: Dict[str, Any] = Field(default_factory=lambda: list)
+    meta: Dict[str, Any] = field(default_factory=dict)
 
     data: bytes | str | None = None
     mimetype: str | None = None
@@ -27,18 +28,10 @@ class Blob(BaseModel):
     encoding: str = "utf-8"
     path: str | PurePath | None = None
 
-    model_config = ConfigDict(
-        arbitrary_types_allowed=True,
-        frozen=True,
-    )
-
-    @classmethod
-    @model_validator(mode="before")
-    def check_blob_is_valid(cls, values: dict[str, Any]) -> Any:
-        if "data" not in values and "path" not in values:
+    def __post_init__(self):
+        if self.data is None and self.path is None:
             msg = "Either data or path must be provided"
             raise ValueError(msg)
-        return values
 
     async def as_string(self) -> str:
         """Read data as a string."""
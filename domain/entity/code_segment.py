@@ -5,14 +5,15 @@
 # @Email   : amashiro2233@gmail.com
 # @File    : code_segment
 # @Software: PyCharm
-from pydantic import BaseModel, ConfigDict, Field
+from dataclasses import dataclass
+from typing import Optional
 
 
-class CodeSegment(BaseModel):
+@dataclass(slots=True)
+class CodeSegment:
     start: int
     end: int
     code: str
-    block: int = Field(default=1)
-    model_config = ConfigDict(
-        extra='ignore'
-    )
+    block: int = 1
+    # 分段时由文件的 token 索引得到的 cl100k_base token 数
+    tokens: Optional[int] = None
@@ -5,37 +5,65 @@
 # @Email   : amashiro2233@gmail.com
 # @File    : document
 # @Software: PyCharm
-from typing import List, Optional
+import json
+from dataclasses import dataclass, fields
+from typing import Annotated, Any, Dict, Iterable, Optional
 
-from pydantic import BaseModel, ConfigDict, Field
+import numpy as np
+from pydantic import Field
 
 
-class DocumentMeta(BaseModel):
-    repo_id: Optional[str] = Field(description='仓库ID')
-    file_id: Optional[str] = Field(description='文件ID')
-    segment_id: str = Field(description='代码段ID uuid4')
-    relative_path: str = Field(description='代码段所属文件相对路径')
-    start_line: int = Field(description='代码块启始行')
-    end_line: int = Field(description='代码块结束行')
-    segment_block: int = Field(description='代码块序号')
-    segment_hash: str = Field(description='代码段哈希')
-    segment_cl100k_base_token: Optional[int] = Field(default=None, description='代码段 cl100k_base token')
-    segment_o200k_base_token: Optional[int] = Field(default=None, description='代码段 o200k_base token')
-    description: Optional[str] = Field(default=None, description='代码描述 可选 用于描述嵌入')
+# 索引过程中每个代码段都会创建，使用 slots dataclass 避免 pydantic 校验开销；
+# 字段说明通过 Annotated 提供，作为 HTTP / MCP 的响应模型时仍由 pydantic 生成 schema 并序列化
+@dataclass(slots=True)
+class DocumentMeta:
+    """代码段元数据"""
+    repo_id: Annotated[Optional[str], Field(description='仓库ID')]
+    file_id: Annotated[Optional[str], Field(description='文件ID')]
+    segment_id: Annotated[str, Field(description='代码段ID uuid4')]
+    relative_path: Annotated[str, Field(description='代码段所属文件相对路径')]
+    start_line: Annotated[int, Field(description='代码块启始行')]
+    end_line: Annotated[int, Field(description='代码块结束行')]
+    segment_block: Annotated[int, Field(description='代码块序号')]
+    segment_hash: Annotated[str, Field(description='代码段哈希')]
+    segment_cl100k_base_token: Annotated[Optional[int], Field(description='代码段 cl100k_base token')] = None
+    segment_o200k_base_token: Annotated[Optional[int], Field(description='代码段 o200k_base token')] = None
+    description: Annotated[Optional[str], Field(description='代码描述 可选 用于描述嵌入')] = None
 
-    score: Optional[float] = Field(default=None, description='相似度评分 仅在相似度匹配时使用')
-    content: Optional[str] = Field(default=None, description='代码块纯文本 兼容qdrant，qdrant其他字段只能存储在payload')
+    score: Annotated[Optional[float], Field(description='相似度评分 仅在相似度匹配时使用')] = None
+    content: Annotated[
+        Optional[str], Field(description='代码块纯文本 兼容qdrant，qdrant其他字段只能存储在payload')
+    ] = None
 
-    model_config = ConfigDict(
-        extra='ignore'
-    )
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DocumentMeta':
+        """从向量库读取的元数据构建，忽略未知字段"""
+        return cls(**{name: value for name, value in data.items() if name in _META_FIELD_NAMES})
 
+    def to_dict(self, exclude: Iterable[str] = (), exclude_none: bool = False) -> Dict[str, Any]:
+        result = {}
+        for name in _META_FIELDS:
+            if name in exclude:
+                continue
+            value = getattr(self, name)
+            if value is None and exclude_none:
+                continue
+            result[name] = value
+        return result
 
-class Document(BaseModel):
-    vector: List[float] = Field(description='向量Embedding', default_factory=list)
-    content: Optional[str] = Field(default=None, description='纯文本代码')
-    meta: Optional[DocumentMeta] = Field(default=None, description='代码元数据')
+    def to_json(self, exclude: Iterable[str] = ()) -> str:
+        return json.dumps(self.to_dict(exclude), ensure_ascii=False)
 
-    model_config = ConfigDict(
-        extra='ignore'
-    )
+
+_META_FIELDS = tuple(field.name for field in fields(DocumentMeta))
+_META_FIELD_NAMES = frozenset(_META_FIELDS)
+
+
+@dataclass(slots=True)
+class Document:
+    # 向量Embedding float32，通常是同一批次矩阵中的一行
+    vector: Optional[np.ndarray] = None
+    # 纯文本代码
+    content: Optional[str] = None
+    # 代码元数据
+    meta: Optional[DocumentMeta] = None
@@ -5,15 +5,14 @@
 # @Email   : amashiro2233@gmail.com
 # @File    : task_context
 # @Software: PyCharm
-
-from pydantic import BaseModel, ConfigDict
+from dataclasses import dataclass
 
 from domain.entity.blob import Blob
 
 
-class TaskContext(BaseModel):
+@dataclass(slots=True)
+class TaskContext:
     repo_id: str
     file_id: str
     relative_path: str
     blob: Blob
-    model_config = ConfigDict(extra='ignore')
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : job_status
+# @Software: PyCharm
+from enum import StrEnum
+
+
+class JobStatus(StrEnum):
+    PENDING: str = "pending"
+    RUNNING: str = "running"
+    SUCCEEDED: str = "succeeded"
+    FAILED: str = "failed"
+    CANCELLED: str = "cancelled"
+    # 服务重启时仍未结束的任务
+    INTERRUPTED: str = "interrupted"
+
+    @property
+    def finished(self) -> bool:
+        return self not in (JobStatus.PENDING, JobStatus.RUNNING)
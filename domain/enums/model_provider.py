@@ -11,3 +11,4 @@ from enum import StrEnum
 class ModelType(StrEnum):
     OPENAI = "openai"
     JINA = "jina"
+    LOCAL = "local"
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class GitIndexRequest(BaseModel):
     uid: str | None = None
@@ -7,4 +7,10 @@ class GitIndexRequest(BaseModel):
     # 私有仓库认证字段
     username: Optional[str] = None  # 用户名
     password: Optional[str] = None  # 密码或个人访问令牌
-    access_token: Optional[str] = None  # 访问令牌（GitHub/GitLab Personal Access Token）
\ No newline at end of file
+    access_token: Optional[str] = None  # 访问令牌（GitHub/GitLab Personal Access Token）
+    # 增量索引
+    full_index: bool = False  # 忽略上次索引的提交，强制全量重建索引
+    # 克隆模式，设置 depth 或 blobless 时不使用镜像缓存，直接克隆到临时目录
+    depth: Optional[int] = Field(default=None, ge=1)  # 浅克隆深度，如 1
+    blobless: bool = False  # 部分克隆（--filter=blob:none），只拉取需要索引的文件内容
+    sparse_paths: Optional[List[str]] = None  # 只索引匹配的路径（sparse-checkout 的 gitignore 语法），如 ["src/"]
\ No newline at end of file
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : index_job_request
+# @Software: PyCharm
+from pydantic import BaseModel, Field
+
+
+class IndexJobRequest(BaseModel):
+    job_id: str = Field(description='索引任务 ID')
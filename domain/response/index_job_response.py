@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : index_job_response
+# @Software: PyCharm
+from typing import Optional
+
+from pydantic import BaseModel
+
+from domain.enums.job_status import JobStatus
+
+
+class IndexJobProgress(BaseModel):
+    discovered: int = 0
+    skipped: int = 0
+    read: int = 0
+    segmented: int = 0
+    embedded: int = 0
+    written: int = 0
+
+
+class IndexJobResponse(BaseModel):
+    job_id: str
+    repo_id: str
+    status: JobStatus
+    progress: IndexJobProgress
+    message: Optional[str] = None
+    created_at: str
+    updated_at: str
@@ -7,14 +7,46 @@
 # @Software: PyCharm
 from loguru import logger
 
+from extensions.git.mirror_store import MirrorStore
+from extensions.job.job_manager import JobManager
+from extensions.state.ext_state import State
 from extensions.vector.ext_vector import Vector
 
 
 class ExtManager:
     vector = Vector()
+    state = State()
+    mirror_store = MirrorStore()
+    job_manager = JobManager(state.job_store)
 
 
 async def init_vector():
     logger.info("Initializing vector")
     await ExtManager.vector.init_app()
     logger.info("Initialized vector")
+
+
+async def init_state():
+    logger.info("Initializing state")
+    await ExtManager.state.init_app()
+    logger.info("Initialized state")
+
+
+async def init_mirror_store():
+    logger.info("Initializing git mirror store")
+    await ExtManager.mirror_store.init()
+    logger.info("Initialized git mirror store")
+
+
+async def init_job_manager():
+    logger.info("Initializing job manager")
+    await ExtManager.job_manager.init()
+    logger.info("Initialized job manager")
+
+
+async def close_job_manager():
+    await ExtManager.job_manager.close()
+
+
+async def close_state():
+    await ExtManager.state.close()
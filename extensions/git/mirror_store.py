@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : mirror_store
+# @Software: PyCharm
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+
+from git import Repo
+from loguru import logger
+
+from setting.setting import We0IndexSettings, get_we0_index_settings
+from utils.path_util import PathUtil
+
+settings: We0IndexSettings = get_we0_index_settings()
+
+MIRROR_SUFFIX = '.git'
+MIRROR_REFSPECS = ['+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*']
+
+
+@dataclass
+class MirrorEntry:
+    path: str
+    size: int = 0
+    last_used: float = 0.0
+    refcount: int = 0
+
+
+class MirrorStore:
+    """
+    持久化的 bare 仓库镜像缓存，以 `domain/owner/repo` 为键
+    首次使用时 clone，之后只做增量 fetch；超过磁盘预算时按 LRU 淘汰未被占用的镜像
+    镜像中不保存认证信息，每次 fetch 时显式传入带认证的 URL
+    """
+
+    def __init__(self):
+        self.root_path = settings.git.mirror.path
+        self.max_disk_bytes = settings.git.mirror.max_disk_mb * 1024 * 1024
+        self._entries: Dict[str, MirrorEntry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def init(self):
+        PathUtil.check_or_make_dir(self.root_path)
+        self._entries = await asyncio.to_thread(self._scan)
+        logger.info(f"Loaded {len(self._entries)} git mirrors, {self.total_size() >> 20} MB")
+
+    def _scan(self) -> Dict[str, MirrorEntry]:
+        entries = {}
+        for root, dirs, _ in os.walk(self.root_path):
+            for directory in list(dirs):
+                path = os.path.join(root, directory)
+                if '.tmp-' in directory:
+                    # 上次进程中断遗留的半成品
+                    shutil.rmtree(path, ignore_errors=True)
+                    dirs.remove(directory)
+                elif directory.endswith(MIRROR_SUFFIX):
+                    key = os.path.relpath(path, self.root_path)[:-len(MIRROR_SUFFIX)].replace(os.sep, '/')
+                    entries[key] = MirrorEntry(
+                        path=path, size=self._disk_usage(path), last_used=os.stat(path).st_mtime
+                    )
+                    dirs.remove(directory)
+        return entries
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.root_path, *key.split('/')) + MIRROR_SUFFIX
+
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    @asynccontextmanager
+    async def acquire(self, key: str, auth_repo_url: str, repo_url: str) -> AsyncIterator[Repo]:
+        """获取最新的镜像仓库，使用期间不会被淘汰"""
+        entry = self._entries.setdefault(key, MirrorEntry(path=self.get_path(key)))
+        entry.refcount += 1
+        try:
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                mirror = await asyncio.to_thread(self._clone_or_fetch, entry.path, auth_repo_url, repo_url)
+                entry.size = await asyncio.to_thread(self._disk_usage, entry.path)
+                entry.last_used = time.time()
+            await self.evict()
+            yield mirror
+        finally:
+            entry.refcount -= 1
+            entry.last_used = time.time()
+            if entry.refcount == 0 and not os.path.isdir(entry.path) and self._entries.get(key) is entry:
+                # clone 失败，不保留空记录
+                del self._entries[key]
+            await self.evict()
+
+    @staticmethod
+    def _clone_or_fetch(path: str, auth_repo_url: str, repo_url: str) -> Repo:
+        if os.path.isdir(path):
+            mirror = Repo(path)
+            mirror.git.fetch('--prune', '--force', '--quiet', auth_repo_url, *MIRROR_REFSPECS)
+            os.utime(path)
+            return mirror
+        tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+        try:
+            mirror = Repo.clone_from(auth_repo_url, tmp_path, bare=True)
+            mirror.git.remote('set-url', 'origin', repo_url)
+            mirror.git.config('--replace-all', 'remote.origin.fetch', MIRROR_REFSPECS[0])
+            mirror.git.config('--add', 'remote.origin.fetch', MIRROR_REFSPECS[1])
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        os.rename(tmp_path, path)
+        return Repo(path)
+
+    async def evict(self):
+        """按 LRU 淘汰镜像，直到总大小不超过磁盘预算"""
+        total_size = self.total_size()
+        if total_size <= self.max_disk_bytes:
+            return
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1].last_used):
+            if total_size <= self.max_disk_bytes:
+                break
+            if entry.refcount > 0:
+                continue
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                # 持有锁后重新检查，检查与移除记录之间没有 await；
+                # 删除期间开始的 acquire 会创建新记录，并等待同一把锁释放后重新 clone
+                if entry.refcount > 0 or self._entries.get(key) is not entry:
+                    continue
+                del self._entries[key]
+                total_size -= entry.size
+                logger.info(f"Evicting git mirror {key} ({entry.size >> 20} MB)")
+                await asyncio.to_thread(shutil.rmtree, entry.path, True)
+
+    @staticmethod
+    def _disk_usage(path: str) -> int:
+        size = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                try:
+                    size += os.lstat(os.path.join(root, file)).st_size
+                except OSError:
+                    continue
+        return size
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : object_reader
+# @Software: PyCharm
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Iterable, List, Optional
+
+from git import GitCommandError
+
+# 普通文件和可执行文件，忽略符号链接(120000)与子模块(160000)
+BLOB_FILE_MODES = ('100644', '100755')
+
+
+@dataclass(frozen=True)
+class TreeEntry:
+    mode: str
+    sha: str
+    size: int
+    path: str
+
+
+async def run_git(repo_path: str, *args: str, stdin: Optional[bytes] = None) -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        'git', '-C', repo_path, *args,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate(stdin)
+    if process.returncode != 0:
+        raise GitCommandError(['git', *args], process.returncode, stderr)
+    return stdout
+
+
+async def list_tree(repo_path: str, commit: str = 'HEAD') -> List[TreeEntry]:
+    """通过 `git ls-tree -r -l` 列出提交中的全部文件，不需要检出工作区"""
+    output = await run_git(repo_path, 'ls-tree', '-r', '-l', '-z', '--full-tree', commit)
+    entries = []
+    for record in output.split(b'\0'):
+        if not record:
+            continue
+        meta, path = record.split(b'\t', 1)
+        mode, object_type, sha, size = meta.split()
+        mode = mode.decode()
+        if object_type != b'blob' or mode not in BLOB_FILE_MODES:
+            continue
+        entries.append(TreeEntry(mode=mode, sha=sha.decode(), size=int(size), path=path.decode('utf-8', 'surrogateescape')))
+    return entries
+
+
+async def prefetch_blobs(repo_path: str, shas: Iterable[str]):
+    """
+    部分克隆（--filter=blob:none）中一次性批量拉取缺失的 blob，
+    避免 cat-file 逐个对象懒加载造成大量网络往返（与 git checkout 内部的批量预取方式相同）。
+    不遍历历史查找缺失对象，直接把需要的 SHA 交给 fetch，全部已在本地时 git 不会发起请求
+    """
+    wanted = list(dict.fromkeys(shas))
+    if not wanted:
+        return
+    await run_git(
+        repo_path, '-c', 'fetch.negotiationAlgorithm=noop', 'fetch', 'origin',
+        '--no-tags', '--no-write-fetch-head', '--recurse-submodules=no', '--filter=blob:none', '--stdin',
+        stdin='\n'.join(wanted).encode() + b'\n'
+    )
+
+
+class GitObjectReader:
+    """
+    通过一个常驻的 `git cat-file --batch` 进程流式读取对象内容
+    请求按顺序写入管道，单独的读取任务按同样的顺序解析响应，多个协程可以并发读取
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+        self._process: asyncio.subprocess.Process | None = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._write_lock = asyncio.Lock()
+        self._reader_task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> 'GitObjectReader':
+        self._process = await asyncio.create_subprocess_exec(
+            'git', '-C', self.repo_path, 'cat-file', '--batch',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=1024 * 1024
+        )
+        self._reader_task = asyncio.create_task(self._read_responses())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._process.returncode is None:
+            self._process.stdin.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            self._process.kill()
+        self._reader_task.cancel()
+        self._fail_pending(RuntimeError('git cat-file process closed'))
+
+    async def read(self, sha: str) -> bytes:
+        future = asyncio.get_running_loop().create_future()
+        async with self._write_lock:
+            if self._process.returncode is not None:
+                raise RuntimeError('git cat-file process exited')
+            self._pending.append(future)
+            self._process.stdin.write(f'{sha}\n'.encode())
+            await self._process.stdin.drain()
+        return await future
+
+    async def _read_responses(self):
+        stdout = self._process.stdout
+        try:
+            while True:
+                header = await stdout.readline()
+                if not header:
+                    break
+                future = self._pending.popleft()
+                parts = header.split()
+                if len(parts) != 3:
+                    # <sha> missing
+                    if not future.done():
+                        future.set_exception(KeyError(f'git object not found: {header.decode().strip()}'))
+                    continue
+                data = await stdout.readexactly(int(parts[2]))
+                await stdout.readexactly(1)  # 结尾的换行
+                if not future.done():
+                    future.set_result(data)
+        except Exception as e:
+            self._fail_pending(e)
+            return
+        self._fail_pending(RuntimeError('git cat-file process exited'))
+
+    def _fail_pending(self, exception: Exception):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(exception)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : job_manager
+# @Software: PyCharm
+import asyncio
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from domain.enums.job_status import JobStatus
+from extensions.state.job_store import JobStore
+
+# 运行中任务的进度写入本地状态库的间隔（秒）
+PROGRESS_FLUSH_INTERVAL = 1
+
+
+@dataclass
+class _RunningJob:
+    task: asyncio.Task
+    # 由任务实时更新的计数器（dataclass）
+    progress: Any
+
+
+class JobManager:
+    """
+    后台索引任务：提交后立即返回任务 ID，任务在后台运行，进度定期持久化
+    相同 dedupe_key 的任务未结束时重复提交会返回同一个任务，避免客户端超时重试导致重复索引
+    """
+
+    def __init__(self, job_store: JobStore):
+        self.job_store = job_store
+        self._jobs: Dict[str, _RunningJob] = {}
+        self._submit_lock = asyncio.Lock()
+        self._closing = False
+
+    async def init(self):
+        interrupted = await self.job_store.interrupt_unfinished()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} unfinished index jobs as interrupted")
+
+    async def close(self):
+        self._closing = True
+        await asyncio.gather(*(self._stop(job_id) for job_id in list(self._jobs)))
+
+    async def submit(
+            self, repo_id: str, dedupe_key: str, progress: Any, run: Callable[[], Awaitable[Optional[str]]]
+    ) -> str:
+        """run 返回任务结束时的说明信息，progress 为 run 过程中更新的计数器"""
+        async with self._submit_lock:
+            job = await self.job_store.get_unfinished(dedupe_key)
+            if job:
+                logger.info(f"Index job {job['job_id']} for {repo_id} is already {job['status']}")
+                return job['job_id']
+            job_id = uuid.uuid4().hex
+            await self.job_store.create(job_id, repo_id, dedupe_key)
+            self._jobs[job_id] = _RunningJob(task=asyncio.create_task(self._run(job_id, progress, run)), progress=progress)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.job_store.get(job_id)
+        running = self._jobs.get(job_id)
+        if job and running:
+            job['progress'] = asdict(running.progress)
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        if job_id not in self._jobs:
+            return False
+        await self._stop(job_id)
+        return True
+
+    async def _stop(self, job_id: str):
+        running = self._jobs[job_id]
+        running.task.cancel()
+        await asyncio.gather(running.task, return_exceptions=True)
+        if running.task.cancelled():
+            # 任务还没开始运行就被取消，_run 中的状态更新不会执行
+            self._jobs.pop(job_id, None)
+            await self.job_store.update(
+                job_id, status=JobStatus.INTERRUPTED if self._closing else JobStatus.CANCELLED
+            )
+
+    async def _run(self, job_id: str, progress: Any, run: Callable[[], Awaitable[Optional[str]]]):
+        flusher = asyncio.create_task(self._flush_progress(job_id, progress))
+        status, message = JobStatus.FAILED, None
+        try:
+            await self.job_store.update(job_id, status=JobStatus.RUNNING)
+            message = await run()
+            status = JobStatus.SUCCEEDED
+        except asyncio.CancelledError:
+            status = JobStatus.INTERRUPTED if self._closing else JobStatus.CANCELLED
+        except Exception as e:
+            logger.exception(e)
+            message = f"{type(e).__name__}: {e}"
+        finally:
+            flusher.cancel()
+            self._jobs.pop(job_id, None)
+            await self.job_store.update(job_id, status=status, progress=asdict(progress), message=message)
+            logger.info(f"Index job {job_id} {status}")
+
+    async def _flush_progress(self, job_id: str, progress: Any):
+        while True:
+            await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+            await self.job_store.update(job_id, progress=asdict(progress))
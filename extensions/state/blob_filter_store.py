@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : blob_filter_store
+# @Software: PyCharm
+from typing import Dict, Iterable
+
+from extensions.state.sqlite_client import SqliteClient
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS non_indexable_blob (
+    blob_sha TEXT NOT NULL,
+    filter_key TEXT NOT NULL DEFAULT '',
+    reason TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (blob_sha, filter_key)
+);
+"""
+
+# SQLite 单条语句的参数个数有上限，分批查询
+QUERY_CHUNK_SIZE = 500
+
+
+class BlobFilterStore:
+    """
+    不可索引 blob 的负缓存（按 blob SHA 记录），只缓存由文件内容决定的结果（如二进制、压缩文件），
+    同样内容的文件在之后的索引中不需要再读取；filter_key 记录判断时使用的阈值，阈值调整后旧结果不再命中
+    """
+
+    def __init__(self, client: SqliteClient):
+        self.client = client
+
+    async def init(self):
+        columns = [row[1] for row in await self.client.fetch_all("PRAGMA table_info(non_indexable_blob)")]
+        if columns and 'filter_key' not in columns:
+            # 旧的记录没有保存判断阈值，直接丢弃，之后重新读取判断即可
+            await self.client.execute("DROP TABLE non_indexable_blob")
+        await self.client.execute_script(SQL_CREATE_TABLE)
+
+    async def get_many(self, blob_shas: Iterable[str], filter_key: str = '') -> Dict[str, str]:
+        """返回 {blob_sha: reason}"""
+        blob_shas = list(blob_shas)
+        result = {}
+        for index in range(0, len(blob_shas), QUERY_CHUNK_SIZE):
+            chunk = blob_shas[index:index + QUERY_CHUNK_SIZE]
+            rows = await self.client.fetch_all(
+                f"SELECT blob_sha, reason FROM non_indexable_blob "
+                f"WHERE filter_key = ? AND blob_sha IN ({','.join('?' * len(chunk))})",
+                [filter_key, *chunk]
+            )
+            result.update(rows)
+        return result
+
+    async def add_many(self, reasons: Dict[str, str], filter_key: str = ''):
+        if not reasons:
+            return
+        await self.client.execute_many(
+            "INSERT OR REPLACE INTO non_indexable_blob (blob_sha, filter_key, reason) VALUES (?, ?, ?)",
+            [(blob_sha, filter_key, reason) for blob_sha, reason in reasons.items()]
+        )
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : checkpoint_store
+# @Software: PyCharm
+from typing import Optional, Set, Tuple
+
+from extensions.state.sqlite_client import SqliteClient
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS index_checkpoint (
+    repo_id TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    scope TEXT NOT NULL DEFAULT '',
+    relative_path TEXT NOT NULL,
+    PRIMARY KEY (repo_id, commit_sha, scope, relative_path)
+);
+"""
+
+
+class CheckpointStore:
+    """
+    索引过程中逐文件记录已写入向量库的文件，进程崩溃或嵌入服务失败后重新索引同一提交时跳过这些文件
+    索引成功完成后清空；scope 与 CommitStore 的相同，索引范围或向量集合变化后检查点失效
+    """
+
+    def __init__(self, client: SqliteClient):
+        self.client = client
+
+    async def init(self):
+        columns = [row[1] for row in await self.client.fetch_all("PRAGMA table_info(index_checkpoint)")]
+        if columns and 'scope' not in columns:
+            # 旧的检查点没有记录索引范围，无法判断是否仍然有效，直接丢弃（只影响中断后的续传）
+            await self.client.execute("DROP TABLE index_checkpoint")
+        await self.client.execute_script(SQL_CREATE_TABLE)
+
+    async def get_paths(self, repo_id: str, commit_sha: str, scope: str = '') -> Set[str]:
+        rows = await self.client.fetch_all(
+            "SELECT relative_path FROM index_checkpoint WHERE repo_id = ? AND commit_sha = ? AND scope = ?",
+            (repo_id, commit_sha, scope)
+        )
+        return {row[0] for row in rows}
+
+    async def add(self, repo_id: str, commit_sha: str, scope: str, relative_path: str):
+        await self.client.execute(
+            "INSERT OR IGNORE INTO index_checkpoint (repo_id, commit_sha, scope, relative_path) VALUES (?, ?, ?, ?)",
+            (repo_id, commit_sha, scope, relative_path)
+        )
+
+    async def delete(self, repo_id: str, keep: Optional[Tuple[str, str]] = None):
+        """删除仓库的检查点，keep 为 (commit_sha, scope) 时保留对应的检查点"""
+        if keep:
+            await self.client.execute(
+                "DELETE FROM index_checkpoint WHERE repo_id = ? AND NOT (commit_sha = ? AND scope = ?)",
+                (repo_id, *keep)
+            )
+        else:
+            await self.client.execute("DELETE FROM index_checkpoint WHERE repo_id = ?", (repo_id,))
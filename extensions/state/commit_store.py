@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : commit_store
+# @Software: PyCharm
+from typing import Optional, Tuple
+
+from extensions.state.sqlite_client import SqliteClient
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS repo_commit (
+    repo_id TEXT PRIMARY KEY,
+    commit_sha TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class CommitStore:
+    """
+    记录每个仓库最近一次完整索引成功的提交 SHA，用于增量索引
+    scope 描述索引范围（如 sparse-checkout 路径），范围变化时不能增量索引
+    """
+
+    def __init__(self, client: SqliteClient):
+        self.client = client
+
+    async def init(self):
+        await self.client.execute_script(SQL_CREATE_TABLE)
+        columns = [row[1] for row in await self.client.fetch_all("PRAGMA table_info(repo_commit)")]
+        if 'scope' not in columns:
+            await self.client.execute("ALTER TABLE repo_commit ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+
+    async def get(self, repo_id: str) -> Optional[Tuple[str, str]]:
+        """返回 (commit_sha, scope)"""
+        row = await self.client.fetch_one(
+            "SELECT commit_sha, scope FROM repo_commit WHERE repo_id = ?",
+            (repo_id,)
+        )
+        return (row[0], row[1]) if row else None
+
+    async def set(self, repo_id: str, commit_sha: str, scope: str = ''):
+        await self.client.execute(
+            "INSERT INTO repo_commit (repo_id, commit_sha, scope) VALUES (?, ?, ?) "
+            "ON CONFLICT (repo_id) DO UPDATE SET "
+            "commit_sha = excluded.commit_sha, scope = excluded.scope, updated_at = CURRENT_TIMESTAMP",
+            (repo_id, commit_sha, scope)
+        )
+
+    async def delete(self, repo_id: str):
+        await self.client.execute("DELETE FROM repo_commit WHERE repo_id = ?", (repo_id,))
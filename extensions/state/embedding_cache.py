@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : embedding_cache
+# @Software: PyCharm
+import time
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+from loguru import logger
+
+from extensions.state.sqlite_client import SqliteClient
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (provider, model, text_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used);
+"""
+
+# SQLite 单条语句的参数个数有上限，分批查询
+QUERY_CHUNK_SIZE = 500
+# 淘汰时删除到预算的比例，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+EVICT_CHUNK_SIZE = 1000
+
+
+class EmbeddingCache:
+    """
+    内容寻址的嵌入缓存，按 (provider, model, 嵌入文本的哈希) 记录 float32 向量
+    使用独立的 SQLite 文件，超过磁盘预算时按最近使用时间（LRU）淘汰
+    """
+
+    def __init__(self, client: SqliteClient, max_bytes: int):
+        self.client = client
+        self.max_bytes = max_bytes
+        self._size = 0
+
+    async def init(self):
+        await self.client.init()
+        await self.client.execute_script(SQL_CREATE_TABLE)
+        row = await self.client.fetch_one("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embedding_cache")
+        self._size = row[0]
+
+    async def close(self):
+        await self.client.close()
+
+    async def get_many(self, provider: str, model: str, text_hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """返回命中的 {text_hash: vector}，并刷新命中项的使用时间"""
+        text_hashes = list(dict.fromkeys(text_hashes))
+        result = {}
+        for index in range(0, len(text_hashes), QUERY_CHUNK_SIZE):
+            chunk = text_hashes[index:index + QUERY_CHUNK_SIZE]
+            rows = await self.client.fetch_all(
+                f"SELECT text_hash, vector FROM embedding_cache WHERE provider = ? AND model = ? "
+                f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                (provider, model, *chunk)
+            )
+            for text_hash, vector in rows:
+                result[text_hash] = np.frombuffer(vector, dtype=np.float32)
+        if result:
+            now = int(time.time())
+            await self.client.execute_many(
+                "UPDATE embedding_cache SET last_used = ? WHERE provider = ? AND model = ? AND text_hash = ?",
+                [(now, provider, model, text_hash) for text_hash in result]
+            )
+        return result
+
+    async def put_many(self, provider: str, model: str, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        now = int(time.time())
+        rows = [
+            (provider, model, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text_hash, vector in vectors.items()
+        ]
+        existing = await self._existing(provider, model, list(vectors))
+        # 相同文本的向量不变，已有的行只刷新使用时间，缓存大小只计入新增的行
+        await self.client.execute_many(
+            "INSERT INTO embedding_cache (provider, model, text_hash, vector, last_used) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (provider, model, text_hash) DO UPDATE SET last_used = excluded.last_used",
+            rows
+        )
+        self._size += sum(len(row[3]) for row in rows if row[2] not in existing)
+        if self._size > self.max_bytes:
+            await self.evict()
+
+    async def _existing(self, provider: str, model: str, text_hashes: List[str]) -> Set[str]:
+        existing = set()
+        for index in range(0, len(text_hashes), QUERY_CHUNK_SIZE):
+            chunk = text_hashes[index:index + QUERY_CHUNK_SIZE]
+            rows = await self.client.fetch_all(
+                f"SELECT text_hash FROM embedding_cache WHERE provider = ? AND model = ? "
+                f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                (provider, model, *chunk)
+            )
+            existing.update(text_hash for text_hash, in rows)
+        return existing
+
+    async def evict(self):
+        target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        evicted = 0
+        while self._size > target:
+            rows = await self.client.fetch_all(
+                "SELECT rowid, LENGTH(vector) FROM embedding_cache ORDER BY last_used LIMIT ?",
+                (EVICT_CHUNK_SIZE,)
+            )
+            if not rows:
+                self._size = 0
+                break
+            rowids = []
+            for rowid, size in rows:
+                if self._size <= target:
+                    break
+                rowids.append((rowid,))
+                self._size -= size
+            await self.client.execute_many("DELETE FROM embedding_cache WHERE rowid = ?", rowids)
+            evicted += len(rowids)
+        # 并发写入同一文本时计数可能有偏差，淘汰后按实际大小校准
+        row = await self.client.fetch_one("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embedding_cache")
+        self._size = row[0]
+        logger.info(f"Evicted {evicted} cached embeddings, cache size {self._size // (1024 * 1024)} MB")
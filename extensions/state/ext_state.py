@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : ext_state
+# @Software: PyCharm
+from typing import Optional
+
+from extensions.state.blob_filter_store import BlobFilterStore
+from extensions.state.checkpoint_store import CheckpointStore
+from extensions.state.commit_store import CommitStore
+from extensions.state.embedding_cache import EmbeddingCache
+from extensions.state.job_store import JobStore
+from extensions.state.sqlite_client import SqliteClient
+from setting.setting import We0IndexSettings, get_we0_index_settings
+
+settings: We0IndexSettings = get_we0_index_settings()
+
+
+class State:
+
+    def __init__(self):
+        self.client = SqliteClient(settings.state.path)
+        self.commit_store = CommitStore(self.client)
+        self.blob_filter_store = BlobFilterStore(self.client)
+        self.job_store = JobStore(self.client)
+        self.checkpoint_store = CheckpointStore(self.client)
+        # 嵌入缓存体积较大，使用独立的数据库文件
+        cache_settings = settings.state.embedding_cache
+        self.embedding_cache: Optional[EmbeddingCache] = EmbeddingCache(
+            SqliteClient(cache_settings.path), cache_settings.max_disk_mb * 1024 * 1024
+        ) if cache_settings.enabled else None
+
+    async def init_app(self) -> None:
+        await self.client.init()
+        await self.commit_store.init()
+        await self.blob_filter_store.init()
+        await self.job_store.init()
+        await self.checkpoint_store.init()
+        if self.embedding_cache:
+            await self.embedding_cache.init()
+
+    async def close(self) -> None:
+        if self.embedding_cache:
+            await self.embedding_cache.close()
+        await self.client.close()
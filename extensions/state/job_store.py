@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : job_store
+# @Software: PyCharm
+import json
+from typing import Any, Dict, Optional
+
+from domain.enums.job_status import JobStatus
+from extensions.state.sqlite_client import SqliteClient
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS index_job (
+    job_id TEXT PRIMARY KEY,
+    repo_id TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    message TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_index_job_dedupe_key ON index_job (dedupe_key, status);
+"""
+
+JOB_COLUMNS = ('job_id', 'repo_id', 'dedupe_key', 'status', 'progress', 'message', 'created_at', 'updated_at')
+UNFINISHED_STATUSES = (JobStatus.PENDING, JobStatus.RUNNING)
+
+
+def _to_job(row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    job['status'] = JobStatus(job['status'])
+    job['progress'] = json.loads(job['progress'])
+    return job
+
+
+class JobStore:
+    """
+    索引任务的状态与进度，持久化在本地，服务重启后仍可查询
+    任务请求中含有认证信息，因此不落盘，重启时未结束的任务标记为 interrupted，由客户端重新提交
+    """
+
+    def __init__(self, client: SqliteClient):
+        self.client = client
+
+    async def init(self):
+        await self.client.execute_script(SQL_CREATE_TABLE)
+
+    async def create(self, job_id: str, repo_id: str, dedupe_key: str):
+        await self.client.execute(
+            "INSERT INTO index_job (job_id, repo_id, dedupe_key, status) VALUES (?, ?, ?, ?)",
+            (job_id, repo_id, dedupe_key, JobStatus.PENDING)
+        )
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return _to_job(await self.client.fetch_one(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM index_job WHERE job_id = ?",
+            (job_id,)
+        ))
+
+    async def get_unfinished(self, dedupe_key: str) -> Optional[Dict[str, Any]]:
+        return _to_job(await self.client.fetch_one(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM index_job WHERE dedupe_key = ? AND status IN (?, ?) "
+            f"ORDER BY created_at DESC LIMIT 1",
+            (dedupe_key, *UNFINISHED_STATUSES)
+        ))
+
+    async def update(
+            self,
+            job_id: str,
+            status: Optional[JobStatus] = None,
+            progress: Optional[Dict[str, int]] = None,
+            message: Optional[str] = None
+    ):
+        assignments, parameters = ['updated_at = CURRENT_TIMESTAMP'], []
+        if status is not None:
+            assignments.append('status = ?')
+            parameters.append(status)
+        if progress is not None:
+            assignments.append('progress = ?')
+            parameters.append(json.dumps(progress))
+        if message is not None:
+            assignments.append('message = ?')
+            parameters.append(message)
+        await self.client.execute(
+            f"UPDATE index_job SET {', '.join(assignments)} WHERE job_id = ?",
+            (*parameters, job_id)
+        )
+
+    async def interrupt_unfinished(self) -> int:
+        return await self.client.execute(
+            "UPDATE index_job SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE status IN (?, ?)",
+            (JobStatus.INTERRUPTED, *UNFINISHED_STATUSES)
+        )
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : sqlite_client
+# @Software: PyCharm
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Optional, Sequence
+
+from utils.path_util import PathUtil
+
+
+class SqliteClient:
+    """
+    本地 SQLite 的异步封装
+    所有语句都在同一个专用线程中串行执行，避免阻塞事件循环，也避免多线程共享连接
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor: ThreadPoolExecutor | None = None
+        self._connection: sqlite3.Connection | None = None
+
+    async def init(self):
+        if self._executor is not None:
+            return
+        PathUtil.check_or_make_dir(os.path.dirname(self.path))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='we0-index-sqlite')
+        await self._run(self._connect)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _connect(self):
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            raise RuntimeError("Sqlite client is not initialized. Call init first.")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def execute_script(self, script: str):
+        await self._run(self._connection.executescript, script)
+
+    async def execute(self, sql: str, parameters: Sequence[Any] = ()) -> int:
+        def _execute() -> int:
+            return self._connection.execute(sql, parameters).rowcount
+
+        return await self._run(_execute)
+
+    async def execute_many(self, sql: str, parameters: Iterable[Sequence[Any]]) -> int:
+        def _execute_many() -> int:
+            with self._connection:
+                self._connection.execute('BEGIN')
+                return self._connection.executemany(sql, parameters).rowcount
+
+        return await self._run(_execute_many)
+
+    async def fetch_one(self, sql: str, parameters: Sequence[Any] = ()) -> Optional[tuple]:
+        def _fetch_one():
+            return self._connection.execute(sql, parameters).fetchone()
+
+        return await self._run(_fetch_one)
+
+    async def fetch_all(self, sql: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        def _fetch_all():
+            return self._connection.execute(sql, parameters).fetchall()
+
+        return await self._run(_fetch_all)
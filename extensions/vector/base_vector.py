@@ -10,6 +10,8 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import List, Optional
 
+import numpy as np
+
 from domain.entity.document import Document, DocumentMeta
 from models.model_factory import ModelFactory
 from setting.setting import get_we0_index_settings
@@ -28,6 +30,11 @@ class BaseVector(ABC):
     async def init(self):
         raise NotImplementedError
 
+    @property
+    def collection(self) -> str:
+        """当前嵌入模型与维度对应的集合名，嵌入模型变化后向量写入新的集合"""
+        return self.collection_name
+
     @abstractmethod
     async def create(self, documents: List[Document]):
         raise NotImplementedError
@@ -53,12 +60,23 @@ class BaseVector(ABC):
             self,
             repo_id: str,
             file_ids: Optional[List[str]],
-            query_vector: List[float],
+            query_vector: np.ndarray,
             top_k: int = 5,
             score_threshold: float = 0.0
     ) -> List[Document]:
         raise NotImplementedError
 
+    @staticmethod
+    def vector_matrix(documents: List[Document]) -> np.ndarray:
+        """把一批文档的向量合并为连续的 float32 矩阵，按行整体复制，不逐元素转换"""
+        return np.ascontiguousarray(np.stack([document.vector for document in documents]), dtype=np.float32)
+
+    @staticmethod
+    def normalize_l2(vectors: np.ndarray) -> np.ndarray:
+        """按最后一维做 L2 归一化，同时适用于单个向量和整批矩阵，零向量保持不变"""
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return np.divide(vectors, norms, out=np.array(vectors, dtype=np.float32), where=norms != 0)
+
     @staticmethod
     def dynamic_collection_name(dimension: int) -> str:
         return f'we0_index_{settings.vector.embedding_model}_{dimension}'.replace('-', '_')
@@ -10,6 +10,7 @@ import inspect
 from typing import List, Optional
 
 import chromadb
+import numpy as np
 from chromadb import QueryResult
 
 from domain.enums.chroma_mode import ChromaMode
@@ -54,8 +55,8 @@ class Chroma(BaseVector):
             name=self.collection_name
         )
         ids = [document.meta.segment_id for document in documents]
-        vectors = [document.vector for document in documents]
-        metas = [document.meta.model_dump(exclude_none=True) for document in documents]
+        vectors = self.vector_matrix(documents)
+        metas = [document.meta.to_dict(exclude_none=True) for document in documents]
         contents = [document.content for document in documents]
         await self._execute_async_or_thread(
             func=collection.upsert, ids=ids, embeddings=vectors, metadatas=metas, documents=contents
@@ -83,7 +84,7 @@ class Chroma(BaseVector):
         if len(metadatas) == 0:
             return []
         metas = metadatas[0]
-        return [DocumentMeta.model_validate(meta) for meta in metas]
+        return [DocumentMeta.from_dict(meta) for meta in metas]
 
     async def drop(self, repo_id: str):
         collection = await self._execute_async_or_thread(
@@ -114,7 +115,7 @@ class Chroma(BaseVector):
             self,
             repo_id: str,
             file_ids: Optional[List[str]],
-            query_vector: List[float],
+            query_vector: np.ndarray,
             top_k: int = 5,
             score_threshold: float = 0.0
     ) -> List[Document]:
@@ -155,7 +156,7 @@ class Chroma(BaseVector):
                 metadata["score"] = distance
                 metadata["content"] = contents[index]
                 document = Document(
-                    meta=DocumentMeta.model_validate(metadata),
+                    meta=DocumentMeta.from_dict(metadata),
                 )
                 documents.append(document)
 
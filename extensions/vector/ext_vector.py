@@ -7,6 +7,7 @@
 # @Software: PyCharm
 from typing import List, Optional
 
+import numpy as np
 from loguru import logger
 
 from domain.enums.vector_type import VectorType
@@ -58,7 +59,7 @@ class Vector:
             raise e
 
     async def search_by_vector(
-            self, repo_id: str, file_ids: Optional[List[str]], query_vector: List[float], top_k: int = 5
+            self, repo_id: str, file_ids: Optional[List[str]], query_vector: np.ndarray, top_k: int = 5
     ) -> List[Document]:
         try:
             return await self.vector_runner.search_by_vector(repo_id, file_ids, query_vector, top_k)
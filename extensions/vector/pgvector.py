@@ -5,11 +5,14 @@
 # @Email   : amashiro2233@gmail.com
 # @File    : pgvector
 # @Software: PyCharm
-import json
+import struct
 from typing import List, Optional
 
 import numpy as np
-from sqlalchemy import text, bindparam
+from psycopg import postgres
+from psycopg.adapt import Dumper
+from psycopg.pq import Format
+from sqlalchemy import event, text, bindparam
 from sqlalchemy.ext.asyncio import create_async_engine
 
 from domain.entity.document import Document, DocumentMeta
@@ -29,6 +32,9 @@ CREATE INDEX IF NOT EXISTS embedding_cosine_idx ON {table_name}
 USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
 """
 
+# pgvector 索引支持的最大维度
+MAX_INDEX_DIMENSION = 2000
+
 SQL_CREATE_TABLE = lambda table_name, dimension: f"""
 CREATE TABLE IF NOT EXISTS {table_name} (
     id UUID PRIMARY KEY,
@@ -41,6 +47,29 @@ CREATE TABLE IF NOT EXISTS {table_name} (
 """
 
 
+class Float4ArrayDumper(Dumper):
+    """
+    以二进制 real[] 传输 float32 向量，数据由 numpy 整体转换为大端字节，不逐元素生成文本；
+    pgvector 提供 real[] 到 vector 的转换
+    """
+    format = Format.BINARY
+    oid = postgres.types['float4'].array_oid
+    element_oid = postgres.types['float4'].oid
+
+    def dump(self, obj: np.ndarray) -> bytes:
+        vector = np.asarray(obj, dtype=np.float32).ravel()
+        # 数组元素为 (长度, 值)，长度固定为 4
+        elements = np.empty(vector.shape[0], dtype=[('length', '>i4'), ('value', '>f4')])
+        elements['length'] = 4
+        elements['value'] = vector
+        # ndim, has_null, element oid, dim size, lower bound
+        return struct.pack('>iiIii', 1, 0, self.element_oid, vector.shape[0], 1) + elements.tobytes()
+
+
+def _register_dumpers(dbapi_connection, connection_record):
+    dbapi_connection.driver_connection.adapters.register_dumper(np.ndarray, Float4ArrayDumper)
+
+
 class PgVector(BaseVector):
 
     def __init__(self):
@@ -48,19 +77,25 @@ class PgVector(BaseVector):
         self.table_name: str | None = None
         self.normalized: bool = False
 
+    @property
+    def collection(self) -> str:
+        return self.table_name
+
     @staticmethod
     def get_client():
         pgvector = settings.vector.pgvector
-        return create_async_engine(
+        engine = create_async_engine(
             url=f"postgresql+psycopg://{pgvector.user}:{pgvector.password}@{pgvector.host}:{pgvector.port}/{pgvector.db}",
             echo=False,
         )
+        event.listen(engine.sync_engine, 'connect', _register_dumpers)
+        return engine
 
     async def init(self):
         async with self.client.begin() as conn:
             dimension = await self.get_dimension()
-            if dimension > 2000:
-                dimension = 2000
+            if dimension > MAX_INDEX_DIMENSION:
+                dimension = MAX_INDEX_DIMENSION
                 self.normalized = True
             self.table_name = self.dynamic_collection_name(dimension)
             await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
@@ -73,7 +108,7 @@ class PgVector(BaseVector):
         stmt = text(
             f"""
                 INSERT INTO {self.table_name} (id, repo_id, file_id, content, meta, embedding) 
-                VALUES (:id, :repo_id, :file_id, :content, :meta, :embedding)
+                VALUES (:id, :repo_id, :file_id, :content, :meta, CAST(:embedding AS vector))
                 ON CONFLICT (id) DO UPDATE SET 
                     repo_id = EXCLUDED.repo_id,
                     file_id = EXCLUDED.file_id,
@@ -82,21 +117,23 @@ class PgVector(BaseVector):
                     embedding = EXCLUDED.embedding
                 """
         )
+        documents = [doc for doc in documents if doc.meta is not None]
+        if not documents:
+            return stmt, []
+        vectors = self.vector_matrix(documents)
+        if self.normalized:
+            # 整批截断后归一化
+            vectors = self.normalize_l2(vectors[:, :MAX_INDEX_DIMENSION])
         parameters = []
-        for doc in documents:
-            if doc.meta is not None:
-                if self.normalized:
-                    vector = self.normalize_l2(doc.vector[:2000])
-                else:
-                    vector = doc.vector
-                parameters.append({
-                    'id': doc.meta.segment_id,
-                    'repo_id': repo_id,
-                    'file_id': doc.meta.file_id,
-                    'content': doc.content,
-                    'meta': doc.meta.model_dump_json(exclude={'score', 'content'}),
-                    'embedding': vector,
-                })
+        for doc, vector in zip(documents, vectors):
+            parameters.append({
+                'id': doc.meta.segment_id,
+                'repo_id': repo_id,
+                'file_id': doc.meta.file_id,
+                'content': doc.content,
+                'meta': doc.meta.to_json(exclude={'score', 'content'}),
+                'embedding': vector,
+            })
 
         return stmt, parameters
 
@@ -138,7 +175,7 @@ class PgVector(BaseVector):
                 }
             )
             records = result.all()
-        return [DocumentMeta.model_validate(meta[0]) for meta in records]
+        return [DocumentMeta.from_dict(meta[0]) for meta in records]
 
     async def drop(self, repo_id: str):
         async with self.client.begin() as conn:
@@ -173,7 +210,7 @@ class PgVector(BaseVector):
             self,
             repo_id: str,
             file_ids: Optional[List[str]],
-            query_vector: List[float],
+            query_vector: np.ndarray,
             top_k: int = 5,
             score_threshold: float = 0.0
     ) -> List[Document]:
@@ -181,15 +218,15 @@ class PgVector(BaseVector):
         async with self.client.begin() as conn:
             # 基础 SQL 查询
             sql_query = (
-                f"SELECT content, meta, embedding <=> :query_vector AS distance "
+                f"SELECT content, meta, embedding <=> CAST(:query_vector AS vector) AS distance "
                 f"FROM {self.table_name} "
                 f"WHERE repo_id = :repo_id "
             )
             if self.normalized:
-                query_vector = self.normalize_l2(query_vector[:2000])
+                query_vector = self.normalize_l2(query_vector[:MAX_INDEX_DIMENSION])
             # 基础参数
             parameters = {
-                "query_vector": json.dumps(query_vector),
+                "query_vector": np.asarray(query_vector, dtype=np.float32),
                 "repo_id": repo_id,
                 "top_k": top_k
             }
@@ -218,17 +255,5 @@ class PgVector(BaseVector):
                 if score > score_threshold:
                     meta["score"] = score
                     meta['content'] = content
-                    documents.append(Document(content=content, meta=DocumentMeta.model_validate(meta)))
+                    documents.append(Document(content=content, meta=DocumentMeta.from_dict(meta)))
         return documents
-
-    @staticmethod
-    def normalize_l2(x: List[float]) -> List[float]:
-        x = np.array(x)
-        if x.ndim == 1:
-            norm = np.linalg.norm(x)
-            if norm == 0:
-                return x.tolist()
-            return (x / norm).tolist()
-        else:
-            norm = np.linalg.norm(x, 2, axis=1, keepdims=True)
-            return np.where(norm == 0, x, x / norm).tolist()
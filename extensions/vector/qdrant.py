@@ -8,6 +8,7 @@
 
 from typing import List, Optional
 
+import numpy as np
 from qdrant_client.async_qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models as rest
 from qdrant_client.http.exceptions import UnexpectedResponse
@@ -78,12 +79,14 @@ class Qdrant(BaseVector):
         print_structs = []
         for document in documents:
             document.meta.content = document.content  # qdrant，就只能存三个值id vector payload，所以只能把content转到meta
-        for document in documents:
+        # qdrant 的请求模型只接受 Python float，整批矩阵一次性转换
+        vectors = self.vector_matrix(documents).tolist()
+        for document, vector in zip(documents, vectors):
             document.meta.repo_id = repo_id
             print_structs.append(rest.PointStruct(
                 id=document.meta.segment_id,
-                vector=document.vector,
-                payload=document.meta.model_dump(exclude_none=True),
+                vector=vector,
+                payload=document.meta.to_dict(exclude_none=True),
             ))
 
         await self.client.upsert(collection_name=self.collection_name, points=print_structs)
@@ -120,7 +123,7 @@ class Qdrant(BaseVector):
                 offset=next_offset
             )
             records.extend(scroll_records)
-        return [DocumentMeta.model_validate(record.payload) for record in records]
+        return [DocumentMeta.from_dict(record.payload) for record in records]
 
     async def drop(self, repo_id: str):
         filter_selector = rest.Filter(
@@ -170,7 +173,7 @@ class Qdrant(BaseVector):
             self,
             repo_id: str,
             file_ids: Optional[List[str]],
-            query_vector: List[float],
+            query_vector: np.ndarray,
             top_k: int = 5,
             score_threshold: float = 0.0
     ) -> List[Document]:
@@ -202,7 +205,7 @@ class Qdrant(BaseVector):
         )
         documents: List[Document] = []
         for point in response.points:
-            meta = DocumentMeta.model_validate(point.payload)
+            meta = DocumentMeta.from_dict(point.payload)
             meta.score = point.score
             documents.append(Document(meta=meta))
         return documents
@@ -19,6 +19,7 @@ from config.loguru import Log
 from domain.result.result import Result
 from exception.exception import CommonException
 from extensions import ext_manager
+from models.model_factory import ModelFactory
 from router.git_router import git_router
 from router.vector_router import vector_router
 from setting.setting import get_we0_index_settings
@@ -29,11 +30,17 @@ settings = get_we0_index_settings()
 async def initialize_extensions():
     await asyncio.gather(
         ext_manager.init_vector(),
+        ext_manager.init_state(),
+        ext_manager.init_mirror_store(),
     )
+    # 任务状态保存在本地状态库中，需要在状态库初始化之后
+    await ext_manager.init_job_manager()
 
 
 async def close_extensions():
-    ...
+    await ext_manager.close_job_manager()
+    await ext_manager.close_state()
+    await ModelFactory.close()
 
 
 @asynccontextmanager
@@ -14,7 +14,8 @@ from mcp.server.lowlevel.server import LifespanResultT, Server
 from mcp.shared.context import RequestT
 
 from extensions import ext_manager
-from router.git_router import clone_and_index
+from models.model_factory import ModelFactory
+from router.git_router import cancel_index_job, clone_and_index, get_index_job, submit_index_job
 from router.vector_router import retrieval
 from setting.setting import get_we0_index_settings
 
@@ -24,8 +25,14 @@ sider_settings = get_we0_index_settings()
 @asynccontextmanager
 async def lifespan(server: Server[LifespanResultT, RequestT]) -> AsyncIterator[object]:
     await ext_manager.init_vector()
+    await ext_manager.init_state()
+    await ext_manager.init_mirror_store()
+    await ext_manager.init_job_manager()
     yield {}
     await ext_manager.init_vector()
+    await ext_manager.close_job_manager()
+    await ext_manager.close_state()
+    await ModelFactory.close()
 
 
 def create_fast_mcp() -> FastMCP:
@@ -34,6 +41,9 @@ def create_fast_mcp() -> FastMCP:
         description="CodeIndex, embedding, retrieval, Tool parameters must be in standard JSON format",
         tools=[
             Tool.from_function(clone_and_index),
+            Tool.from_function(submit_index_job),
+            Tool.from_function(get_index_job),
+            Tool.from_function(cancel_index_job),
             Tool.from_function(retrieval),
         ],
         lifespan=lifespan,
@@ -7,7 +7,7 @@
 # @Software: PyCharm
 """Abstract interface for document loader implementations."""
 
-from typing import AsyncIterator, Type
+from typing import AsyncIterator, Iterator, Type
 
 from domain.entity.blob import Blob
 from domain.entity.code_segment import CodeSegment
@@ -25,6 +25,26 @@ class RepoLoader:
         else:
             return LineBasedSegmenter
 
+    @classmethod
+    def segment_text(cls, text: str, extension: str | None = None) -> Iterator[CodeSegment]:
+        segmenter = cls.get_segmenter_constructor(extension=extension).from_tiktoken_encoder(text=text, merge_small_chunks=True)
+        if not segmenter.is_valid():
+            # 复用已经编码好的 token 索引
+            segmenter = cls.get_segmenter_constructor().from_tiktoken_encoder(
+                text=text, token_index=segmenter.token_index
+            )
+
+        yield from segmenter.segment()
+
+    @classmethod
+    def load_segments(cls, blob: Blob) -> Iterator[CodeSegment]:
+        """同步分段，CPU 密集，可在线程池中执行"""
+        if isinstance(blob.data, str):
+            text = blob.data
+        else:
+            text = blob.as_bytes().decode(blob.encoding)
+        yield from cls.segment_text(text, blob.extension)
+
     @classmethod
     async def load_blob(cls, blob: Blob) -> AsyncIterator[CodeSegment]:
         try:
@@ -32,9 +52,5 @@ class RepoLoader:
         except Exception as e:
             raise e
 
-        segmenter = cls.get_segmenter_constructor(extension=blob.extension).from_tiktoken_encoder(text=text, merge_small_chunks=True)
-        if not segmenter.is_valid():
-            segmenter = cls.get_segmenter_constructor().from_tiktoken_encoder(text=text)
-
-        for code in segmenter.segment():
+        for code in cls.segment_text(text, blob.extension):
             yield code
@@ -5,12 +5,18 @@
 # @Email   : amashiro2233@gmail.com
 # @File    : line_based_segmenter
 # @Software: PyCharm
+import re
 from bisect import bisect_right, bisect_left
 from typing import List, Dict, Any, Tuple, Iterator
 
 from domain.entity.code_segment import CodeSegment
 from loader.segmenter.base_segmenter import BaseSegmenter
 
+# str.splitlines 识别的换行符，\r\n 算作一个
+LINE_BREAK_PATTERN = re.compile(r'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+# 与 str.strip 的空白字符一致
+NON_SPACE_PATTERN = re.compile(r'\S')
+
 
 class LineBasedSegmenter(BaseSegmenter):
 
@@ -28,110 +34,134 @@ class LineBasedSegmenter(BaseSegmenter):
         self.min_chunk_size = min_chunk_size
         self.delimiters = delimiters or ['\n\n', '\n']
 
-        # 构建行号位置映射
-        self.line_positions = self._build_line_positions(text)
+        # 构建行号位置映射（按 \n 分行）
+        self.line_starts, self.line_ends = self._build_line_positions(text)
+        # str.splitlines 意义下每个换行符的起止位置，用于计算任意区间的行数
+        self.break_starts: List[int] = []
+        self.break_ends: List[int] = []
+        for match in LINE_BREAK_PATTERN.finditer(text):
+            self.break_starts.append(match.start())
+            self.break_ends.append(match.end())
 
     def segment(self) -> Iterator[CodeSegment]:
         """执行分块操作"""
-        initial_range = (0, len(self.text))
-        segments = self._recursive_split(initial_range, self.delimiters)
+        segments = self._split_long_lines()
         if self.merge_small_chunks:
             segments = self._merge_small_segments(segments)
         for segment in segments:
-            code_segment = CodeSegment.model_validate(segment)
-            if not code_segment.code.isspace():
-                yield code_segment
+            if not segment["code"].isspace():
+                yield self._build_segment(segment)
 
     @staticmethod
-    def _build_line_positions(text: str) -> List[Tuple[int, int]]:
-        """生成每行的字符位置范围列表 (start, end)"""
-        lines = []
+    def _build_line_positions(text: str) -> Tuple[List[int], List[int]]:
+        """生成每行的起始、结束字符位置列表"""
+        starts = []
+        ends = []
         start = 0
         for line in text.split('\n'):
-            end = start + len(line)
-            lines.append((start, end))
-            start = end + 1  # 跳过换行符
-        return lines
+            starts.append(start)
+            ends.append(start + len(line))
+            start += len(line) + 1  # 跳过换行符
+        return starts, ends
 
     def _get_original_lines(self, start_pos: int, end_pos: int) -> Tuple[int, int]:
         """根据字符位置获取原始行号 (1-based)"""
-        starts = [line[0] for line in self.line_positions]
-        ends = [line[1] for line in self.line_positions]
-
-        start_line = bisect_right(starts, start_pos)
-        end_line = bisect_left(ends, end_pos)
+        start_line = bisect_right(self.line_starts, start_pos)
+        end_line = bisect_left(self.line_ends, end_pos)
 
         # 处理边界情况
         start_line = max(0, start_line - 1) if start_line > 0 else 0
-        end_line = min(end_line, len(ends) - 1)
+        end_line = min(end_line, len(self.line_ends) - 1)
 
         return start_line + 1, end_line + 1  # 转换为1-based
 
+    def _count_lines(self, start_pos: int, end_pos: int) -> int:
+        """
+        等价于 len(self.text[start_pos:end_pos].splitlines())，不复制文本。
+        区间端点落在 \r\n 中间时，切片后的 \r 或 \n 单独算作换行
+        """
+        if end_pos <= start_pos:
+            return 0
+        first = bisect_left(self.break_starts, start_pos)
+        last = bisect_left(self.break_starts, end_pos)
+        breaks = last - first
+        last_break_end = self.break_ends[last - 1] if breaks else start_pos
+        if first > 0 and self.break_ends[first - 1] > start_pos:
+            # 起点在 \r\n 的 \n 上
+            breaks += 1
+            last_break_end = max(last_break_end, start_pos + 1)
+        # 最后一个换行之后还有内容时多一行
+        return breaks + (last_break_end < end_pos)
+
+    def _split_long_lines(self) -> List[Dict[str, Any]]:
+        """
+        逐行扫描一次全文，去掉首尾空白后 token 数超过 max_tokens 的行强制拆分，其余区间按分隔符递归拆分。
+        递归得到的子区间中的每一行都是这里某一行的一部分，token 数不会更多，因此只在这里检查一次
+        """
+        end_pos = len(self.text)
+        if self.max_tokens is None:
+            return self._recursive_split((0, end_pos), self.delimiters)
+
+        segments = []
+        current_chunk_start = 0
+        pos = 0
+        line_ends = self.break_ends if not self.break_ends or self.break_ends[-1] == end_pos \
+            else self.break_ends + [end_pos]
+        for line_end in line_ends:
+            line = self.text[pos:line_end]
+            # 对单行去掉首尾空白后计算 token 数
+            line_start = line_end - len(line.lstrip())
+            if self.count_tokens(line_start, pos + len(line.rstrip())) > self.max_tokens:
+                # 先处理该行之前的部分（如果存在）
+                if pos > current_chunk_start:
+                    segments.extend(
+                        self._recursive_split((current_chunk_start, pos), self.delimiters)
+                    )
+                # 对这一行进行强制拆分（标记 forced 为 True）
+                segments.extend(
+                    self._forced_split((pos, line_end), block=1)
+                )
+                current_chunk_start = line_end
+            pos = line_end
+        if current_chunk_start < end_pos:
+            segments.extend(
+                self._recursive_split((current_chunk_start, end_pos), self.delimiters)
+            )
+        return segments
+
     def _recursive_split(
             self,
             char_range: Tuple[int, int],
             delimiters: List[str]
     ) -> List[Dict[str, Any]]:
         start_pos, end_pos = char_range
-        text = self.text[start_pos:end_pos]
-
-        if self.max_tokens is not None:
-            raw_lines = text.splitlines(keepends=True)
-            segments = []
-            current_chunk_start = start_pos
-            pos = start_pos
-            any_long_line = False
-            for line in raw_lines:
-                # 对单行去掉首尾空白后计算 token 数
-                if self.length_function(line.strip()) > self.max_tokens:
-                    any_long_line = True
-                    # 先处理该行之前的部分（如果存在）
-                    if pos > current_chunk_start:
-                        segments.extend(
-                            self._recursive_split((current_chunk_start, pos), delimiters)
-                        )
-                    # 对这一行进行强制拆分（标记 forced 为 True）
-                    segments.extend(
-                        self._forced_split((pos, pos + len(line)), block=1)
-                    )
-                    current_chunk_start = pos + len(line)
-                pos += len(line)
-            if any_long_line:
-                if current_chunk_start < end_pos:
-                    segments.extend(
-                        self._recursive_split((current_chunk_start, end_pos), delimiters)
-                    )
-                return segments
-
-        current_lines = len(text.splitlines())
 
         # 判断是否需要分割
-        need_split = False
-        if current_lines > self.max_chunk_size:
-            need_split = True
-        if self.max_tokens is not None:
-            current_tokens = self.length_function(text)
-            if current_tokens > self.max_tokens:
-                need_split = True
+        need_split = self._count_lines(start_pos, end_pos) > self.max_chunk_size
+        if not need_split and self.max_tokens is not None:
+            need_split = self.count_tokens(start_pos, end_pos) > self.max_tokens
 
         if not need_split:
+            text = self.text[start_pos:end_pos]
             code = text.strip()
             if not code:
                 return []
             start_line, end_line = self._get_original_lines(start_pos, end_pos)
+            code_start = start_pos + len(text) - len(text.lstrip())
             # 正常返回的分块，标记 forced 为 False
             return [{
                 "start": start_line,
                 "end": end_line,
                 "code": code,
+                "start_pos": code_start,
+                "end_pos": code_start + len(code),
                 "forced": False
             }]
 
         # 尝试使用当前分隔符分割
         if delimiters:
             current_delim = delimiters[0]
-            parts = text.split(current_delim)
-            if len(parts) > 1:
+            if self.text.find(current_delim, start_pos, end_pos) != -1:
                 return self._split_by_delimiter(start_pos, end_pos, current_delim, delimiters[1:])
 
         # 无有效分隔符时强制分割
@@ -144,51 +174,33 @@ class LineBasedSegmenter(BaseSegmenter):
             delimiter: str,
             next_delimiters: List[str]
     ) -> List[Dict[str, Any]]:
-        """使用指定分隔符进行分割"""
-        text = self.text[start_pos:end_pos]
+        """使用指定分隔符进行分割，只在原文上查找分隔符位置，不切分字符串"""
         delim_len = len(delimiter)
         segments = []
         current_start = start_pos
 
-        for part in text.split(delimiter):
-            if not part.strip():
-                current_start += len(part) + delim_len
-                continue
-
-            part_end = current_start + len(part)
-            sub_segments = self._recursive_split(
-                (current_start, part_end),
-                next_delimiters
-            )
-            segments.extend(sub_segments)
+        while True:
+            part_end = self.text.find(delimiter, current_start, end_pos)
+            is_last = part_end == -1
+            if is_last:
+                part_end = end_pos
+            # 跳过只有空白的部分
+            if NON_SPACE_PATTERN.search(self.text, current_start, part_end):
+                segments.extend(
+                    self._recursive_split((current_start, part_end), next_delimiters)
+                )
+            if is_last:
+                return segments
             current_start = part_end + delim_len
 
-        return segments
-
     def _compute_optimal_chunk_length(self, char_range: Tuple[int, int]) -> int:
         """
-        在指定的字符区间内（二分查找），计算一个合适的拆分长度，使得：
-        self.length_function(文本[start_pos:start_pos+chunk_len]) <= self.max_tokens
+        在指定的字符区间内，计算一个合适的拆分长度，使得：
+        self.count_tokens(start_pos, start_pos + chunk_len) <= self.max_tokens
         """
         start_pos, end_pos = char_range
-        total_chars = end_pos - start_pos
-
-        low, high = 1, total_chars
-        increment_value = self.max_tokens // 10
-        optimal = low  # 至少保证 1 个字符
-        while low <= high:
-            mid = (low + high) // 2
-            chunk_text = self.text[start_pos:start_pos + mid]
-            token_count = self.length_function(chunk_text)
-            if token_count <= self.max_tokens:
-                # 当前长度符合要求，记录下来并尝试更大的长度
-                optimal = mid
-                low = mid + increment_value
-            else:
-                # 当前长度超出限制，尝试减小长度
-                high = mid - increment_value
-
-        return optimal
+        # 至少保证 1 个字符
+        return max(self.token_cut(start_pos, end_pos, self.max_tokens) - start_pos, 1)
 
     def _forced_split(self, char_range: Tuple[int, int], block: int = 1) -> List[Dict[str, Any]]:
         start_pos, end_pos = char_range
@@ -199,13 +211,17 @@ class LineBasedSegmenter(BaseSegmenter):
         while pos < end_pos:
             optimal_chunk_size = self._compute_optimal_chunk_length((pos, end_pos))
             next_pos = min(pos + optimal_chunk_size, end_pos)
-            chunk_text = self.text[pos:next_pos].strip()
+            raw_text = self.text[pos:next_pos]
+            chunk_text = raw_text.strip()
             if chunk_text:
                 start_line, end_line = self._get_original_lines(pos, next_pos)
+                chunk_start = pos + len(raw_text) - len(raw_text.lstrip())
                 segments.append({
                     "start": start_line,
                     "end": end_line,
                     "code": chunk_text,
+                    "start_pos": chunk_start,
+                    "end_pos": chunk_start + len(chunk_text),
                     "forced": True,  # 标记为强制拆分生成的片段
                     "block": current_block
                 })
@@ -214,48 +230,50 @@ class LineBasedSegmenter(BaseSegmenter):
         return segments
 
     def _merge_small_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        相邻分块合并。合并过程中只记录分块列表和行数，每组的代码在组确定后一次性拼接；
+        各分块的代码都已去掉首尾空白，以换行拼接后的行数即为两者行数之和
+        """
         merged = []
         if not segments:
             return merged
-        buffer = segments[0]
+        group = [segments[0]]
+        group_lines = self._count_lines(segments[0]["start_pos"], segments[0]["end_pos"])
         for seg in segments[1:]:
+            buffer = group[0]
+            seg_lines = self._count_lines(seg["start_pos"], seg["end_pos"])
             # 如果一个分块是强制拆分的，而另一个不是，则不进行合并，直接分开处理
             if buffer.get("forced", False) != seg.get("forced", False):
-                merged.append(buffer)
-                buffer = seg
-                continue
-
-            merged_code = f"{buffer['code']}\n{seg['code']}"
-            merged_lines = len(merged_code.splitlines())
-            current_lines = buffer["end"] - buffer["start"] + 1
-            next_lines = seg["end"] - seg["start"] + 1
-
-            if self.max_tokens is not None:
-                # 有 token 限制时，必须确保合并后 token 数不超过限制
-                merged_tokens = self.length_function(merged_code)
-                if merged_tokens <= self.max_tokens:
-                    buffer = {
-                        "start": buffer["start"],
-                        "end": seg["end"],
-                        "code": merged_code.strip(),
-                        "forced": buffer.get("forced", False)
-                    }
-                else:
-                    merged.append(buffer)
-                    buffer = seg
+                can_merge = False
+            elif self.max_tokens is not None:
+                # 有 token 限制时，必须确保合并后 token 数不超过限制，合并后的区间为两个分块之间的原文
+                can_merge = self.count_tokens(buffer["start_pos"], seg["end_pos"]) <= self.max_tokens
             else:
                 # 无 token 限制时，基于行数进行合并：
                 # 如果合并后行数不超过 max_chunk_size 或者任一块过小，都可以合并
-                if (merged_lines <= self.max_chunk_size) or (
-                        current_lines < self.min_chunk_size or next_lines < self.min_chunk_size):
-                    buffer = {
-                        "start": buffer["start"],
-                        "end": seg["end"],
-                        "code": merged_code.strip(),
-                        "forced": buffer.get("forced", False)
-                    }
-                else:
-                    merged.append(buffer)
-                    buffer = seg
-        merged.append(buffer)
+                current_lines = group[-1]["end"] - buffer["start"] + 1
+                next_lines = seg["end"] - seg["start"] + 1
+                can_merge = (group_lines + seg_lines <= self.max_chunk_size) or (
+                        current_lines < self.min_chunk_size or next_lines < self.min_chunk_size)
+            if can_merge:
+                group.append(seg)
+                group_lines += seg_lines
+            else:
+                merged.append(self._join_segments(group))
+                group = [seg]
+                group_lines = seg_lines
+        merged.append(self._join_segments(group))
         return merged
+
+    @staticmethod
+    def _join_segments(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if len(group) == 1:
+            return group[0]
+        return {
+            "start": group[0]["start"],
+            "end": group[-1]["end"],
+            "code": "\n".join(seg["code"] for seg in group),
+            "start_pos": group[0]["start_pos"],
+            "end_pos": group[-1]["end_pos"],
+            "forced": group[0].get("forced", False)
+        }
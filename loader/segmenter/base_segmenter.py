@@ -6,21 +6,58 @@
 # @File    : base_segmenter
 # @Software: PyCharm
 from abc import ABC, abstractmethod
-from typing import Any, Callable, Collection, Union, Literal, Optional, Iterator
+from typing import Any, Callable, Collection, Dict, Union, Literal, Optional, Iterator
 
 from domain.entity.code_segment import CodeSegment
+from loader.segmenter.token_index import TokenIndex
 
 
 class BaseSegmenter(ABC):
+    text: str
+
     def __init__(
             self,
             max_tokens: int = 512,
             length_function: Callable[[str], int] = len,
             merge_small_chunks: bool = False,
+            token_index: Optional[TokenIndex] = None,
     ):
         self.max_tokens = max_tokens
         self.length_function = length_function
         self.merge_small_chunks = merge_small_chunks
+        # 整个文件编码一次得到的 token 位置，存在时区间 token 数直接由索引得到
+        self.token_index = token_index
+
+    def count_tokens(self, start: int, end: int) -> int:
+        """self.text[start:end] 的 token 数"""
+        if self.token_index is not None:
+            return self.token_index.count(start, end)
+        return self.length_function(self.text[start:end])
+
+    def token_cut(self, start: int, end: int, max_tokens: int) -> int:
+        """
+        self.text[start:end] 中 token 数不超过 max_tokens 的最长前缀的结束位置；
+        有 token 索引时直接按 token 起始位置切分，否则二分查找
+        """
+        if self.token_index is not None:
+            return self.token_index.cut(start, end, max_tokens)
+        low, high = start, end
+        best = start
+        while low <= high:
+            mid = (low + high) // 2
+            if self.length_function(self.text[start:mid]) <= max_tokens:
+                best = mid
+                low = mid + 1
+            else:
+                high = mid - 1
+        return best
+
+    def _build_segment(self, segment: Dict[str, Any]) -> CodeSegment:
+        """分块带有字符区间 start_pos / end_pos 时由 token 索引得到 token 数"""
+        tokens = None
+        if self.token_index is not None and "start_pos" in segment:
+            tokens = self.token_index.count(segment["start_pos"], segment["end_pos"])
+        return CodeSegment(segment["start"], segment["end"], segment["code"], segment.get("block", 1), tokens)
 
     def is_valid(self) -> bool:
         return True
@@ -77,4 +114,6 @@ class BaseSegmenter(ABC):
                 )
             )
 
+        if kwargs.get('token_index') is None and kwargs.get('text') is not None:
+            kwargs['token_index'] = TokenIndex(kwargs['text'], enc, allowed_special, disallowed_special)
         return cls(length_function=_tiktoken_encoder, **kwargs)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : token_index
+# @Software: PyCharm
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Collection, List, Literal, Union
+
+import numpy as np
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def _token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """词表中每个 token 的字节长度，每种编码只计算一次"""
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return lengths
+
+
+class TokenIndex:
+    """
+    整个文件只编码一次，记录每个 token 在文本中的起始字符位置；
+    任意字符区间 [start, end) 的 token 数为起始位置落在区间内的 token 个数，二分查找即可得到，不需要重新编码。
+    与单独编码子串相比只在区间边界处可能相差一两个 token
+    """
+
+    def __init__(
+            self,
+            text: str,
+            encoding: tiktoken.Encoding,
+            allowed_special: Union[Literal["all"], Collection[str]] = frozenset(),
+            disallowed_special: Union[Literal["all"], Collection[str]] = "all",
+    ):
+        self.text = text
+        self.tokens: List[int] = encoding.encode(
+            text, allowed_special=allowed_special, disallowed_special=disallowed_special
+        )
+        data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+        # 每个字节所属字符的下标（UTF-8 续字节不是字符起始）
+        char_of_byte = np.cumsum((data & 0xC0) != 0x80) - 1
+        token_lengths = _token_byte_lengths(encoding)[np.asarray(self.tokens, dtype=np.int64)]
+        byte_starts = np.concatenate(([0], np.cumsum(token_lengths)[:-1])) if self.tokens else token_lengths
+        # token 从多字节字符中间开始时，归到该字符
+        self.offsets: List[int] = char_of_byte[byte_starts].tolist() if len(data) else []
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def count(self, start: int, end: int) -> int:
+        """text[start:end] 的 token 数"""
+        if end <= start:
+            return 0
+        return bisect_left(self.offsets, end) - bisect_left(self.offsets, start)
+
+    def cut(self, start: int, end: int, max_tokens: int) -> int:
+        """
+        从 start 开始最多包含 max_tokens 个 token 的最长区间 [start, cut) 的结束位置（不超过 end），
+        即第 max_tokens 个之后那个 token 的起始位置
+        """
+        index = bisect_left(self.offsets, start) + max_tokens
+        if index >= len(self.offsets):
+            return end
+        return min(self.offsets[index], end)
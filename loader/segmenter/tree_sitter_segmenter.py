@@ -1,14 +1,35 @@
+import threading
 from abc import abstractmethod
-from collections import deque
-from typing import List, Dict, Any, Iterator
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Type
 
-from tree_sitter import Language, Parser
+import numpy as np
+from tree_sitter import Language, Node, Parser, Query, Tree
 
 from domain.entity.code_segment import CodeSegment
 from loader.segmenter.base_segmenter import BaseSegmenter
 
 
+class TreeSitterContext:
+    """同一线程内同一语言共用的 Language、Parser、编译好的查询和节点类型集合，Parser 和 Query 不能跨线程共享"""
+
+    def __init__(self, language: Language, node_types: Iterable[str], recursion_node_types: Iterable[str]):
+        self.language = language
+        self.parser = Parser()
+        self.parser.language = language
+        self.queries: Dict[str, Query] = {}
+        self.node_types = frozenset(node_types)
+        self.recursion_node_types = frozenset(recursion_node_types)
+
+    def query(self, source: str) -> Query:
+        query = self.queries.get(source)
+        if query is None:
+            query = self.queries[source] = self.language.query(source)
+        return query
+
+
 class TreeSitterSegmenter(BaseSegmenter):
+    _local = threading.local()
+
     def __init__(
             self,
             text: str,
@@ -26,7 +47,10 @@ class TreeSitterSegmenter(BaseSegmenter):
         self.max_chunk_size = max_chunk_size
         self.max_depth = max_depth
         self.split_large_chunks = split_large_chunks
-        self.parser = self.get_parser()
+        self.context = self.get_context()
+        self.parser = self.context.parser
+        self._source: Optional[bytes] = None
+        self._tree: Optional[Tree] = None
 
     @abstractmethod
     def get_language(self) -> Language:
@@ -51,41 +75,48 @@ class TreeSitterSegmenter(BaseSegmenter):
         """
         raise NotImplementedError
 
+    @property
+    def source(self) -> bytes:
+        if self._source is None:
+            self._source = bytes(self.text, "utf-8")
+        return self._source
+
+    @property
+    def tree(self) -> Tree:
+        """只解析一次，is_valid 和 segment 共用"""
+        if self._tree is None:
+            self._tree = self.parser.parse(self.source)
+        return self._tree
+
     def is_valid(self) -> bool:
         """简单检查语法是否存在 ERROR 节点"""
-        error_query = self.parser.language.query("(ERROR) @error")
-        tree = self.parser.parse(bytes(self.text, encoding="UTF-8"))
-        return len(error_query.captures(tree.root_node)) == 0
+        error_query = self.context.query("(ERROR) @error")
+        return len(error_query.captures(self.tree.root_node)) == 0
 
     def segment(self) -> Iterator[CodeSegment]:
-        tree = self.parser.parse(bytes(self.text, "utf-8"))
-        unfiltered_nodes = deque()
-        for child in tree.root_node.children:
-            unfiltered_nodes.append((child, 1))
-        all_nodes = []
-        while unfiltered_nodes:
-            current_node, current_depth = unfiltered_nodes.popleft()
-            if current_node.type in self.get_node_types():
-                all_nodes.append(current_node)
-            if current_node.type in self.get_recursion_node_types():
-                if current_depth < self.max_depth:
-                    for child in current_node.children:
-                        unfiltered_nodes.append((child, current_depth + 1))
+        all_nodes = self._collect_nodes(self.tree.root_node)
         all_nodes.sort(key=lambda n: (n.start_point[0], -n.end_point[0]))
+        char_of_byte = self._char_of_byte()
 
-        processed_ranges = []
+        # 节点按 (起始行, -结束行) 排序，已保留区间的起始行都不大于当前节点，
+        # 因此当前节点被覆盖当且仅当已保留区间的最大结束行不小于它的结束行
+        covered_end = -1
         processed_chunks_info = []
         for node in all_nodes:
             start_0 = node.start_point[0]
             end_0 = node.end_point[0]
-            node_text = node.text.decode()
-            if self._is_range_covered(start_0, end_0, processed_ranges):
+            if end_0 <= covered_end:
                 continue
-            processed_ranges.append((start_0, end_0))
+            covered_end = end_0
+            # 只对保留的节点从原文切出代码
+            start_pos = self._char_offset(char_of_byte, node.start_byte)
+            end_pos = self._char_offset(char_of_byte, node.end_byte)
             processed_chunks_info.append({
                 "start": start_0 + 1,
                 "end": end_0 + 1,
-                "code": node_text
+                "code": self.text[start_pos:end_pos],
+                "start_pos": start_pos,
+                "end_pos": end_pos
             })
 
         processed_chunks_info.sort(key=lambda x: x["start"])
@@ -93,6 +124,10 @@ class TreeSitterSegmenter(BaseSegmenter):
         code_lines = self.text.split("\n")
         # 明确计算总行数：tree-sitter 的行数 = 文件中 "\n" 数量 + 1
         total_lines = self.text.count("\n") + 1
+        # 每行起始字符位置
+        self.line_starts = [0] * total_lines
+        for index in range(1, total_lines):
+            self.line_starts[index] = self.line_starts[index - 1] + len(code_lines[index - 1]) + 1
 
         combined_chunks = []
         current_pos = 0  # 0-based 行号
@@ -105,11 +140,7 @@ class TreeSitterSegmenter(BaseSegmenter):
                     current_pos
                 )
                 combined_chunks.extend(unprocessed)
-            combined_chunks.append({
-                "start": chunk["start"],
-                "end": chunk["end"],
-                "code": chunk["code"]
-            })
+            combined_chunks.append(chunk)
             current_pos = chunk_end_0 + 1
 
         if current_pos < total_lines:
@@ -123,26 +154,61 @@ class TreeSitterSegmenter(BaseSegmenter):
         if self.max_tokens:
             final_chunks = self._split_by_tokens(final_chunks, self.max_tokens)
         for segment in final_chunks:
-            code_segment = CodeSegment.model_validate(segment)
-            if not code_segment.code.isspace():
-                yield code_segment
-
-    def get_parser(self) -> Parser:
-        """初始化并返回 Parser 对象"""
-        parser = Parser()
-        parser.language = self.get_language()
-        return parser
+            if not segment["code"].isspace():
+                yield self._build_segment(segment)
 
-    @staticmethod
-    def _is_range_covered(start: int, end: int, existing_ranges: List[tuple]) -> bool:
+    def _collect_nodes(self, root: Node) -> List[Node]:
         """
-        优化后的区间覆盖检查（时间复杂度 O(n)）。
-        如果已有区间 [existing_start, existing_end] 能完全覆盖 [start, end]，则返回 True
+        从根节点逐层查找目标节点（根节点的子节点深度为 1），只进入递归类型的节点且不超过 max_depth，
+        结果按 (深度, 起始位置) 排列，与逐层遍历的顺序一致
         """
-        for (existing_start, existing_end) in existing_ranges:
-            if existing_start <= start and end <= existing_end:
-                return True
-        return False
+        node_types = self.context.node_types
+        recursion_node_types = self.context.recursion_node_types
+        nodes = []
+        parents = [root]
+        depth = 1
+        while parents:
+            next_parents = []
+            for parent in parents:
+                for child in parent.children:
+                    node_type = child.type
+                    if node_type in node_types:
+                        nodes.append(child)
+                    if depth < self.max_depth and node_type in recursion_node_types:
+                        next_parents.append(child)
+            parents = next_parents
+            depth += 1
+        return nodes
+
+    def _char_of_byte(self) -> Optional[np.ndarray]:
+        """UTF-8 字节偏移到字符偏移的映射，纯 ASCII 文本两者相同，返回 None"""
+        if self.text.isascii():
+            return None
+        data = np.frombuffer(self.source, dtype=np.uint8)
+        # 末尾追加一个位置，对应文本结尾
+        return np.append(np.cumsum((data & 0xC0) != 0x80) - 1, len(self.text))
+
+    @staticmethod
+    def _char_offset(char_of_byte: Optional[np.ndarray], byte_offset: int) -> int:
+        return byte_offset if char_of_byte is None else int(char_of_byte[byte_offset])
+
+    def get_context(self) -> TreeSitterContext:
+        """返回当前线程中该语言的 TreeSitterContext，首次使用时创建"""
+        contexts: Optional[Dict[Type[TreeSitterSegmenter], TreeSitterContext]] = getattr(
+            self._local, 'contexts', None
+        )
+        if contexts is None:
+            contexts = self._local.contexts = {}
+        context = contexts.get(type(self))
+        if context is None:
+            context = contexts[type(self)] = TreeSitterContext(
+                self.get_language(), self.get_node_types(), self.get_recursion_node_types()
+            )
+        return context
+
+    def get_parser(self) -> Parser:
+        """返回当前线程中该语言复用的 Parser 对象"""
+        return self.get_context().parser
 
     def _handle_unprocessed(self, lines: List[str], start_0: int) -> List[Dict[str, Any]]:
         """处理未识别的代码区域。"""
@@ -150,16 +216,20 @@ class TreeSitterSegmenter(BaseSegmenter):
             return []
         return self._split_into_chunks_without_empty_lines(lines, start_0)
 
-    @staticmethod
     def _split_into_chunks_without_empty_lines(
+            self,
             lines: List[str],
             start_0_based: int
     ) -> List[Dict[str, Any]]:
         """将未识别区域当作一个连续块输出，保留所有行"""
+        code = "\n".join(lines)
+        start_pos = self.line_starts[start_0_based]
         return [{
             "start": start_0_based + 1,
             "end": start_0_based + len(lines),
-            "code": "\n".join(lines)
+            "code": code,
+            "start_pos": start_pos,
+            "end_pos": start_pos + len(code)
         }]
 
     def _post_process_chunks(
@@ -193,8 +263,8 @@ class TreeSitterSegmenter(BaseSegmenter):
         else:
             return split_chunks
 
-    @staticmethod
     def _split_large_chunk(
+            self,
             chunk: Dict[str, Any],
             chunk_size: int,
             max_chunk_size: int
@@ -202,9 +272,10 @@ class TreeSitterSegmenter(BaseSegmenter):
         """
         如果某个 chunk 行数大于 max_chunk_size，
         则根据 chunk_size 进行“均分拆分”，保证子块不会过大或过小。
+        chunk 的代码为原文 [start_pos, end_pos)，除首行外每行都从原文行首开始，
+        子块直接按行起始位置从原文切出
         """
-        lines = chunk["code"].split("\n")
-        total_lines = len(lines)
+        total_lines = chunk["end"] - chunk["start"] + 1
         if total_lines <= max_chunk_size:
             return [chunk]
 
@@ -221,15 +292,24 @@ class TreeSitterSegmenter(BaseSegmenter):
         results = []
         current_index = 0
         original_start = chunk["start"]
+        start_pos = chunk["start_pos"]
         for i in range(n):
             current_chunk_size = base_size + (1 if i < remainder else 0)
-            sub_lines = lines[current_index: current_index + current_chunk_size]
+            next_index = current_index + current_chunk_size
+            if next_index < total_lines:
+                next_start_pos = self.line_starts[original_start - 1 + next_index]
+                end_pos = next_start_pos - 1
+            else:
+                next_start_pos = end_pos = chunk["end_pos"]
             results.append({
                 "start": original_start + current_index,
-                "end": original_start + current_index + current_chunk_size - 1,
-                "code": "\n".join(sub_lines)
+                "end": original_start + next_index - 1,
+                "code": self.text[start_pos:end_pos],
+                "start_pos": start_pos,
+                "end_pos": end_pos
             })
-            current_index += current_chunk_size
+            start_pos = next_start_pos
+            current_index = next_index
         return results
 
     @staticmethod
@@ -243,8 +323,11 @@ class TreeSitterSegmenter(BaseSegmenter):
         对较小 chunk (< min_chunk_size) 做前后合并（只要合并后不超过 max_chunk_size）。
         同时设置了一个“理想范围”容差（tolerance_low ~ tolerance_high），
         如果相邻块本身已经在理想范围内，就不再合并以免破坏合理块。
+        合并过程只记录每组覆盖的 chunk 下标区间和行数（以换行拼接后行数相加），
+        代码在合并结束后每组拼接一次
         """
-        merged = chunks.copy()
+        # (第一个 chunk 下标, 最后一个 chunk 下标, 行数)
+        merged = [(index, index, chunk["code"].count("\n") + 1) for index, chunk in enumerate(chunks)]
         changed = True
         tolerance_low = 0.8 * chunk_size
         tolerance_high = 1.2 * chunk_size
@@ -255,7 +338,7 @@ class TreeSitterSegmenter(BaseSegmenter):
             i = 0
             while i < len(merged):
                 current = merged[i]
-                current_lines = len(current["code"].split("\n"))
+                current_lines = current[2]
 
                 # 如果当前 chunk 已经足够大，则直接放入 new_merged
                 if current_lines >= min_chunk_size:
@@ -268,8 +351,7 @@ class TreeSitterSegmenter(BaseSegmenter):
 
                 # 尝试与前一个合并
                 if new_merged:
-                    prev = new_merged[-1]
-                    prev_lines = len(prev["code"].split("\n"))
+                    prev_lines = new_merged[-1][2]
                     # 如果前一个 chunk 不在理想范围内，且合并后行数不超过 max_chunk_size
                     if not (tolerance_low <= prev_lines <= tolerance_high):
                         if prev_lines + current_lines <= max_chunk_size:
@@ -279,8 +361,7 @@ class TreeSitterSegmenter(BaseSegmenter):
                                 best_score = score
                 # 尝试与后一个合并
                 if i + 1 < len(merged):
-                    nxt = merged[i + 1]
-                    nxt_lines = len(nxt["code"].split("\n"))
+                    nxt_lines = merged[i + 1][2]
                     if not (tolerance_low <= nxt_lines <= tolerance_high):
                         if current_lines + nxt_lines <= max_chunk_size:
                             score = abs((current_lines + nxt_lines) - chunk_size)
@@ -288,40 +369,38 @@ class TreeSitterSegmenter(BaseSegmenter):
                                 best_merge = 'next'
                 if best_merge == 'prev':
                     prev = new_merged.pop()
-                    new_chunk = {
-                        "start": prev["start"],
-                        "end": current["end"],
-                        "code": prev["code"] + "\n" + current["code"]
-                    }
-                    new_merged.append(new_chunk)
+                    new_merged.append((prev[0], current[1], prev[2] + current_lines))
                     i += 1
                     changed = True
                 elif best_merge == 'next':
                     nxt = merged[i + 1]
-                    new_chunk = {
-                        "start": current["start"],
-                        "end": nxt["end"],
-                        "code": current["code"] + "\n" + nxt["code"]
-                    }
-                    new_merged.append(new_chunk)
+                    new_merged.append((current[0], nxt[1], current_lines + nxt[2]))
                     i += 2
                     changed = True
                 else:
                     # 如果当前 chunk 特别小 (< min_chunk_size/2)，则尝试强制与前一个合并
                     if current_lines < (min_chunk_size / 2) and new_merged:
                         prev = new_merged.pop()
-                        new_chunk = {
-                            "start": prev["start"],
-                            "end": current["end"],
-                            "code": prev["code"] + "\n" + current["code"]
-                        }
-                        new_merged.append(new_chunk)
+                        new_merged.append((prev[0], current[1], prev[2] + current_lines))
                         changed = True
                     else:
                         new_merged.append(current)
                     i += 1
             merged = new_merged
-        return merged
+
+        results = []
+        for first, last, _ in merged:
+            if first == last:
+                results.append(chunks[first])
+                continue
+            results.append({
+                "start": chunks[first]["start"],
+                "end": chunks[last]["end"],
+                "code": "\n".join(chunk["code"] for chunk in chunks[first:last + 1]),
+                "start_pos": chunks[first]["start_pos"],
+                "end_pos": chunks[last]["end_pos"]
+            })
+        return results
 
     def _split_by_tokens(
             self,
@@ -332,7 +411,7 @@ class TreeSitterSegmenter(BaseSegmenter):
         processed = []
         for chunk in chunks:
             current_code = chunk["code"]
-            current_tokens = self.length_function(current_code)
+            current_tokens = self.count_tokens(chunk["start_pos"], chunk["end_pos"])
             if current_tokens <= max_tokens:
                 if block == 1:
                     processed.append(chunk)
@@ -352,27 +431,47 @@ class TreeSitterSegmenter(BaseSegmenter):
                 first_end = first_start + split_index - 1
                 second_start = first_end + 1
                 second_end = chunk["end"]
-                first_sub = {"start": first_start, "end": first_end, "code": first_code}
-                second_sub = {"start": second_start, "end": second_end, "code": second_code}
+                first_pos = chunk["start_pos"]
+                second_pos = first_pos + len(first_code) + 1
+                first_sub = {
+                    "start": first_start, "end": first_end, "code": first_code,
+                    "start_pos": first_pos, "end_pos": first_pos + len(first_code)
+                }
+                second_sub = {
+                    "start": second_start, "end": second_end, "code": second_code,
+                    "start_pos": second_pos, "end_pos": second_pos + len(second_code)
+                }
                 processed.extend(self._split_by_tokens([first_sub, second_sub], max_tokens, block))
             else:
-                code = current_code
-                low, high = 0, len(code)
-                best_mid = 0
-                while low <= high:
-                    mid = (low + high) // 2
-                    part = code[:mid]
-                    if self.length_function(part) <= max_tokens:
-                        best_mid = mid
-                        low = mid + 1
-                    else:
-                        high = mid - 1
-                best_mid = best_mid if best_mid != 0 else len(code) // 2
-                first_part = code[:best_mid]
-                second_part = code[best_mid:]
-                first_sub = {"start": chunk["start"], "end": chunk["end"], "code": first_part}
-                second_sub = {"start": chunk["start"], "end": chunk["end"], "code": second_part}
-                # 递归调用时增加序号
-                processed.extend(self._split_by_tokens([first_sub], max_tokens, block))
-                processed.extend(self._split_by_tokens([second_sub], max_tokens, block + 1))
+                processed.extend(self._split_line_by_tokens(chunk, max_tokens, block))
         return processed
+
+    def _split_line_by_tokens(
+            self,
+            chunk: Dict[str, Any],
+            max_tokens: int,
+            block: int
+    ) -> List[Dict[str, Any]]:
+        """单行超过 max_tokens 时，依次在第 max_tokens 个 token 之后切开，每一段序号加一"""
+        pieces = []
+        code = chunk["code"]
+        start_pos = chunk["start_pos"]
+        pos, end_pos = start_pos, chunk["end_pos"]
+        while True:
+            if self.count_tokens(pos, end_pos) <= max_tokens:
+                split_pos = end_pos
+            else:
+                split_pos = self.token_cut(pos, end_pos, max_tokens)
+                if split_pos <= pos:
+                    split_pos = pos + max((end_pos - pos) // 2, 1)
+            piece = {
+                "start": chunk["start"], "end": chunk["end"], "code": code[pos - start_pos:split_pos - start_pos],
+                "start_pos": pos, "end_pos": split_pos
+            }
+            if block != 1:
+                piece["block"] = block
+            pieces.append(piece)
+            if split_pos >= end_pos:
+                return pieces
+            pos = split_pos
+            block += 1
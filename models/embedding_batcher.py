@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : embedding_batcher
+# @Software: PyCharm
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    进程级的嵌入请求合批：收集所有进行中的文件和请求提交的文本，
+    达到条数上限、token 预算或等待时间窗口后合并为一次嵌入调用，再把结果分发给各个调用方；
+    同一批次中相同的文本只嵌入一次
+    """
+
+    def __init__(
+            self,
+            embed: Callable[[List[str], List[int]], Awaitable[np.ndarray]],
+            max_items: int,
+            max_tokens: int,
+            max_wait: float
+    ):
+        self._embed = embed
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self._pending: Dict[str, asyncio.Future] = {}
+        # 待合批文本的 token 数
+        self._pending_token_counts: Dict[str, int] = {}
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, texts: List[str], tokens: List[int]) -> List[np.ndarray]:
+        """tokens 为各文本的 token 数"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text, text_tokens in zip(texts, tokens):
+            future = self._pending.get(text)
+            if future is None:
+                if self._pending and self._pending_tokens + text_tokens > self.max_tokens:
+                    self._flush()
+                future = loop.create_future()
+                self._pending[text] = future
+                self._pending_token_counts[text] = text_tokens
+                self._pending_tokens += text_tokens
+                if len(self._pending) >= self.max_items:
+                    self._flush()
+                elif self._timer is None:
+                    self._timer = loop.call_later(self.max_wait, self._flush)
+            futures.append(future)
+        # 结果可能被多个调用方共享，调用方取消时不能取消共享的 future
+        return list(await asyncio.gather(*(asyncio.shield(future) for future in futures)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, token_counts = self._pending, self._pending_token_counts
+        self._pending, self._pending_token_counts, self._pending_tokens = {}, {}, 0
+        task = asyncio.create_task(self._dispatch(batch, token_counts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: Dict[str, asyncio.Future], token_counts: Dict[str, int]):
+        texts = list(batch)
+        try:
+            vectors = await self._embed(texts, [token_counts[text] for text in texts])
+        except BaseException as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        for text, vector in zip(texts, vectors):
+            future = batch[text]
+            if not future.done():
+                future.set_result(vector)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : endpoint_pool
+# @Software: PyCharm
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, List, Optional, TypeVar
+
+from loguru import logger
+
+from models.rate_limiter import classify_error
+from setting.setting import EndpointPoolSettings
+
+T = TypeVar('T')
+
+# 用于计算对冲延迟的最近请求耗时样本数
+LATENCY_SAMPLES = 200
+# 全部副本熔断且有试探请求进行中时，重新选择副本的间隔（秒）
+PROBE_WAIT_INTERVAL = 0.1
+
+
+class Endpoint:
+    """单个嵌入服务副本，带有连续失败计数的熔断器"""
+
+    def __init__(self, base_url: str, client: Any):
+        self.base_url = base_url
+        self.client = client
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.0
+        # 半开状态下只放行一个试探请求
+        self.probing = False
+
+    def available(self, now: float) -> bool:
+        return now >= self.open_until and not self.probing
+
+    def on_success(self):
+        self.failures = 0
+        self.probing = False
+
+    def on_failure(self, now: float, threshold: int, reset_timeout: float):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= threshold:
+            if now >= self.open_until:
+                logger.warning(f"Embedding endpoint {self.base_url} is unavailable, open circuit for {reset_timeout}s")
+            self.open_until = now + reset_timeout
+
+
+class EndpointPool:
+    """
+    多个 OpenAI 兼容嵌入服务副本之间的负载均衡：
+    - 选择进行中请求最少的可用副本
+    - 每个副本独立熔断，连续失败达到阈值后暂停一段时间，之后放行一个试探请求
+    - 请求失败时立即切换到其他副本
+    - 可选对冲：请求超过最近耗时的分位数仍未返回时，向另一个副本再发一次，取先返回的结果
+    """
+
+    def __init__(self, endpoints: List[Endpoint], pool_settings: EndpointPoolSettings):
+        self.endpoints = endpoints
+        self.settings = pool_settings
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def _pick(self, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        """选择可用副本，没有可用副本时返回 None"""
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint not in exclude and endpoint.available(now)]
+        if not available:
+            return None
+        least = min(endpoint.outstanding for endpoint in available)
+        endpoint = random.choice([endpoint for endpoint in available if endpoint.outstanding == least])
+        if endpoint.failures >= self.settings.failure_threshold:
+            endpoint.probing = True
+        return endpoint
+
+    async def _acquire(self, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        """
+        选择可用副本；其余副本全部熔断时等待最早恢复的副本进入半开状态，同样只放行一个试探请求，
+        不直接拒绝请求。所有副本都已尝试过时返回 None
+        """
+        while True:
+            endpoint = self._pick(exclude)
+            if endpoint is not None:
+                return endpoint
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            if not candidates:
+                return None
+            # 试探请求进行中的副本没有确定的恢复时间，短暂等待后重新选择
+            delay = min(endpoint.open_until for endpoint in candidates) - time.monotonic()
+            await asyncio.sleep(max(delay, PROBE_WAIT_INTERVAL))
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.settings.hedging or len(self.endpoints) < 2:
+            return None
+        if len(self._latencies) < self.settings.hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        delay = latencies[int(self.settings.hedge_percentile * (len(latencies) - 1))]
+        return max(delay, self.settings.hedge_min_delay_ms / 1000)
+
+    async def _call_endpoint(self, endpoint: Endpoint, call: Callable[[Any], Awaitable[T]]) -> T:
+        endpoint.outstanding += 1
+        start = time.monotonic()
+        try:
+            result = await call(endpoint.client)
+        except asyncio.CancelledError:
+            endpoint.probing = False
+            raise
+        except Exception as e:
+            if classify_error(e)[0]:
+                endpoint.on_failure(time.monotonic(), self.settings.failure_threshold, self.settings.reset_timeout)
+            else:
+                # 请求本身的错误（如 400）与副本健康无关
+                endpoint.on_success()
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        endpoint.on_success()
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    async def call(self, call: Callable[[Any], Awaitable[T]]) -> T:
+        """call 接收副本的客户端并发起请求；所有副本都失败时抛出最后一个错误"""
+        tried: List[Endpoint] = []
+        pending = set()
+        hedged = False
+        last_error: Optional[Exception] = None
+        try:
+            while True:
+                if not pending:
+                    endpoint = await self._acquire(tried)
+                    if endpoint is None:
+                        raise last_error
+                    tried.append(endpoint)
+                    pending.add(asyncio.create_task(self._call_endpoint(endpoint, call)))
+                hedge_delay = None if hedged else self._hedge_delay()
+                done, pending = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超过对冲延迟仍未返回，向另一个副本再发一次
+                    hedged = True
+                    endpoint = self._pick(tried)
+                    if endpoint is not None:
+                        tried.append(endpoint)
+                        pending.add(asyncio.create_task(self._call_endpoint(endpoint, call)))
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                    if not classify_error(last_error)[0]:
+                        raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
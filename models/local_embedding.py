@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : local_embedding
+# @Software: PyCharm
+import asyncio
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+from setting.setting import LocalEmbeddingSettings
+
+# 不依赖任何模型文件的确定性测试模型
+HASH_MODEL_NAME = 'hash'
+
+_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class LocalEmbeddingModel(ABC):
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """在工作线程中调用，返回 (len(texts), dimension) 的 float32 矩阵"""
+        raise NotImplementedError
+
+
+class HashEmbeddingModel(LocalEmbeddingModel):
+    """
+    特征哈希：词和字符三元组经 blake2b 映射到固定维度并带符号累加，结果只取决于文本本身，
+    不同进程、不同机器之间一致，用于测试和离线环境
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_PATTERN.findall(text.lower())
+        trigrams = [word[i:i + 3] for word in words if len(word) > 3 for i in range(len(word) - 2)]
+        return words + trigrams
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            digests = np.array(
+                [int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+                 for feature in features],
+                dtype=np.uint64
+            )
+            buckets = (digests % np.uint64(self.dimension)).astype(np.intp)
+            signs = np.where(digests >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], buckets, signs)
+        return _normalize(vectors)
+
+
+class SentenceTransformerModel(LocalEmbeddingModel):
+
+    def __init__(self, model_path: str, max_length: int):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "Local embedding model requires 'sentence-transformers' (pip install sentence-transformers)"
+            )
+        self.model = SentenceTransformer(model_path, device='cpu')
+        self.model.max_seq_length = max_length
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32, copy=False)
+
+
+class OnnxEmbeddingModel(LocalEmbeddingModel):
+    """
+    目录中需要 model.onnx（或 onnx/model.onnx）和 tokenizer.json，
+    输出为 last_hidden_state 时按 attention_mask 做平均池化
+    """
+
+    def __init__(self, model_path: str, max_length: int):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("Local ONNX embedding model requires 'onnxruntime' and 'tokenizers'")
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        # 并行度由线程池中的批次提供，单个会话只使用一个线程，避免线程数超过核数
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            find_onnx_file(model_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            inputs['token_type_ids'] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        output = self.session.run(None, {name: value for name, value in inputs.items() if name in self.input_names})[0]
+        if output.ndim == 3:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return _normalize(output.astype(np.float32, copy=False))
+
+
+def find_onnx_file(model_path: str) -> Optional[str]:
+    for candidate in ('model.onnx', os.path.join('onnx', 'model.onnx')):
+        path = os.path.join(model_path, candidate)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_local_model(model_name: str, local_settings: LocalEmbeddingSettings) -> LocalEmbeddingModel:
+    """embedding-model 为 hash 时使用测试模型，否则从 model-path（未配置时为 embedding-model）加载"""
+    if model_name == HASH_MODEL_NAME:
+        return HashEmbeddingModel(local_settings.hash_dimension)
+    model_path = local_settings.model_path or model_name
+    backend = local_settings.backend
+    if backend == 'auto':
+        backend = 'onnx' if find_onnx_file(model_path) else 'sentence-transformers'
+    logger.info(f"Loading local embedding model {model_path} ({backend})")
+    match backend:
+        case 'onnx':
+            return OnnxEmbeddingModel(model_path, local_settings.max_length)
+        case 'sentence-transformers':
+            return SentenceTransformerModel(model_path, local_settings.max_length)
+        case _:
+            raise ValueError(f"Unknown local embedding backend: {backend}")
+
+
+class LocalEmbedder:
+    """
+    进程内 CPU 推理：输入按 batch-size 切分后在线程池中并行计算，
+    ONNX Runtime / PyTorch 推理时会释放 GIL，线程数默认等于 CPU 核数
+    """
+
+    def __init__(self, model: LocalEmbeddingModel, workers: int, batch_size: int):
+        self.model = model
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='local-embedding')
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self.model.encode, texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ))
+        return np.concatenate(results)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
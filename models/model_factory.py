@@ -6,13 +6,26 @@
 # @File    : model_factory
 # @Software: PyCharm
 import asyncio
-from typing import List, Tuple, Dict, Iterable
+import importlib.util
+import os
+from typing import Any, Awaitable, List, Tuple, Dict, Iterable, Optional
 
-from openai.types import CreateEmbeddingResponse
+import httpx
+import numpy as np
+from loguru import logger
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletion
 
 from clients import jina
+from clients.embedding_response import EmbeddingArrayResponse, create_openai_embeddings
 from domain.enums.model_provider import ModelType
+from models.endpoint_pool import Endpoint, EndpointPool
+from models.embedding_batcher import EmbeddingBatcher
+from models.local_embedding import LocalEmbedder, load_local_model
+from models.rate_limiter import AdaptiveDispatcher
+from setting.setting import RateLimitSettings, get_we0_index_settings
+from utils.helper import Helper
+
+settings = get_we0_index_settings()
 
 
 class ModelInstance:
@@ -20,46 +33,100 @@ class ModelInstance:
     def __init__(self, model_type: ModelType, model_name: str):
         self.model_type = model_type
         self.model_name = model_name
+        self._embedding_batcher: Optional[EmbeddingBatcher] = None
 
     def get_completions_client(self):
         match self.model_type:
             case ModelType.OPENAI:
-                import openai
-                return openai.AsyncClient().chat.completions
+                return ModelFactory.get_client(self.model_type).chat.completions
             case _:
                 raise Exception(f"Unknown model type: {self.model_type}")
 
     def get_embedding_client(self):
         match self.model_type:
-            case ModelType.OPENAI:
-                import openai
-                return openai.AsyncClient().embeddings
-            case ModelType.JINA:
-                return jina.AsyncClient().embeddings
+            case ModelType.OPENAI | ModelType.JINA:
+                return ModelFactory.get_client(self.model_type).embeddings
             case _:
                 raise Exception(f"Unknown model type: {self.model_type}")
 
-    async def create_embedding(self, documents: List[str]) -> List[List[float]]:
+    async def create_embedding(self, documents: List[str], tokens: Optional[List[int]] = None) -> np.ndarray:
+        """
+        返回 (len(documents), dimension) 的 float32 矩阵
+        tokens 为各文本的 cl100k_base token 数（索引时由分段结果得到），未传入时在这里编码计算
+        """
         match self.model_type:
             case ModelType.OPENAI | ModelType.JINA:
-                docs_seq = list(documents)
-                if len(docs_seq) > 2048:
-                    all_embeddings: List[List[float]] = []
-                    for start in range(0, len(docs_seq), 2048):
-                        batch = docs_seq[start: start + 2048]
-                        resp = await self.get_embedding_client().create(
-                            input=batch, model=self.model_name
-                        )
-                        all_embeddings.extend(d.embedding for d in resp.data)
-                    return all_embeddings
-                else:
-                    resp = await self.get_embedding_client().create(
-                        input=docs_seq, model=self.model_name
-                    )
-                    return [d.embedding for d in resp.data]
+                documents = list(documents)
+                if tokens is None:
+                    tokens = await asyncio.to_thread(Helper.calculate_tokens_batch, documents)
+                batches = self._pack_batches(documents, tokens)
+                # 同时进行的请求数由提供商的限流调度器统一控制；各批次为输入中连续的片段，按顺序拼接即为原始顺序
+                results = await asyncio.gather(
+                    *(self._create_embedding_batch(batch, batch_tokens) for batch, batch_tokens in batches)
+                )
+                if not results:
+                    return np.zeros((0, 0), dtype=np.float32)
+                return np.concatenate(results)
+            case ModelType.LOCAL:
+                embedder = await ModelFactory.get_local_embedder(self.model_name)
+                return await embedder.embed(list(documents))
             case _:
                 raise Exception(f"Unknown model type: {self.model_type}")
 
+    @staticmethod
+    def _pack_batches(documents: List[str], tokens: List[int]) -> List[Tuple[List[str], int]]:
+        """按条数和 token 上限顺序切分请求批次，返回 [(批次文本, 批次 token 数)]"""
+        request_settings = settings.vector.embedding_request
+        batches: List[Tuple[List[str], int]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for document, document_tokens in zip(documents, tokens):
+            if batch and (
+                    len(batch) >= request_settings.max_items
+                    or batch_tokens + document_tokens > request_settings.max_tokens
+            ):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(document)
+            batch_tokens += document_tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    async def _create_embedding_batch(self, batch: List[str], batch_tokens: int) -> np.ndarray:
+        """经过提供商的限流调度发送一次嵌入请求，失败时按限流策略重试"""
+
+        def _request(client) -> Awaitable[EmbeddingArrayResponse]:
+            match self.model_type:
+                case ModelType.OPENAI:
+                    return create_openai_embeddings(client, input=batch, model=self.model_name)
+                case ModelType.JINA:
+                    return client.embeddings.create_array(input=batch, model=self.model_name)
+                case _:
+                    raise Exception(f"Unknown model type: {self.model_type}")
+
+        resp: EmbeddingArrayResponse = await ModelFactory.get_dispatcher(self.model_type).run(
+            lambda: ModelFactory.get_endpoint_pool(self.model_type).call(_request),
+            tokens=batch_tokens,
+            usage=lambda response: response.total_tokens
+        )
+        return resp.embeddings
+
+    async def create_embedding_batched(self, documents: List[str], tokens: List[int]) -> List[np.ndarray]:
+        """
+        与其他进行中的请求合批后再嵌入，适用于批量索引，单条查询直接使用 create_embedding
+        tokens 为各文本的 cl100k_base token 数，用于合批和请求切分
+        """
+        if self._embedding_batcher is None:
+            batch_settings = settings.vector.embedding_batch
+            self._embedding_batcher = EmbeddingBatcher(
+                embed=self.create_embedding,
+                max_items=batch_settings.max_items,
+                max_tokens=batch_settings.max_tokens,
+                max_wait=batch_settings.max_wait_ms / 1000
+            )
+        return await self._embedding_batcher.embed(documents, tokens)
+
     async def create_completions(self, messages: Iterable[ChatCompletionMessageParam]) -> str:
         match self.model_type:
             case ModelType.OPENAI:
@@ -74,6 +141,13 @@ class ModelInstance:
 class ModelFactory:
     _lock = asyncio.Lock()
     _instances: Dict[Tuple[ModelType, str], ModelInstance] = {}
+    # 每个 (provider, base_url) 共用一个长连接池的客户端
+    _clients: Dict[Tuple[ModelType, str], Any] = {}
+    # 每个提供商共用一个限流调度器
+    _dispatchers: Dict[ModelType, AdaptiveDispatcher] = {}
+    _endpoint_pools: Dict[ModelType, EndpointPool] = {}
+    _local_lock = asyncio.Lock()
+    _local_embedders: Dict[str, LocalEmbedder] = {}
 
     @classmethod
     async def get_model(cls, model_provider: ModelType, model_name: str) -> ModelInstance:
@@ -84,3 +158,96 @@ class ModelFactory:
                     instance = ModelInstance(model_provider, model_name)
                     cls._instances[key] = instance
         return cls._instances[key]
+
+    @classmethod
+    def get_client(cls, model_provider: ModelType, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        if base_url is None:
+            match model_provider:
+                case ModelType.OPENAI:
+                    base_url = os.environ.get('OPENAI_BASE_URL') or 'https://api.openai.com/v1'
+                case ModelType.JINA:
+                    base_url = os.environ.get('JINA_BASE_URL') or 'https://api.jina.ai/v1'
+                case _:
+                    raise Exception(f"Unknown model type: {model_provider}")
+        key = (model_provider, base_url)
+        if key not in cls._clients:
+            cls._clients[key] = cls._create_client(model_provider, base_url, api_key)
+        return cls._clients[key]
+
+    @classmethod
+    def get_endpoint_pool(cls, model_provider: ModelType) -> EndpointPool:
+        """嵌入提供商配置了多个副本时在副本间负载均衡，否则只有默认地址一个副本"""
+        if model_provider not in cls._endpoint_pools:
+            pool_settings = settings.vector.embedding_pool
+            if model_provider == settings.vector.embedding_provider and pool_settings.endpoints:
+                endpoints = [
+                    Endpoint(endpoint.base_url, cls.get_client(model_provider, endpoint.base_url, endpoint.api_key))
+                    for endpoint in pool_settings.endpoints
+                ]
+            else:
+                client = cls.get_client(model_provider)
+                endpoints = [Endpoint(str(client.base_url), client)]
+            cls._endpoint_pools[model_provider] = EndpointPool(endpoints, pool_settings)
+        return cls._endpoint_pools[model_provider]
+
+    @classmethod
+    async def get_local_embedder(cls, model_name: str) -> LocalEmbedder:
+        if model_name not in cls._local_embedders:
+            async with cls._local_lock:
+                if model_name not in cls._local_embedders:
+                    local_settings = settings.vector.local_embedding
+                    # 加载模型文件较慢，不阻塞事件循环
+                    model = await asyncio.to_thread(load_local_model, model_name, local_settings)
+                    cls._local_embedders[model_name] = LocalEmbedder(
+                        model,
+                        workers=local_settings.workers or os.cpu_count() or 1,
+                        batch_size=local_settings.batch_size
+                    )
+        return cls._local_embedders[model_name]
+
+    @classmethod
+    def get_dispatcher(cls, model_provider: ModelType) -> AdaptiveDispatcher:
+        if model_provider not in cls._dispatchers:
+            cls._dispatchers[model_provider] = AdaptiveDispatcher(
+                name=model_provider,
+                limit_settings=settings.vector.rate_limits.get(model_provider) or RateLimitSettings()
+            )
+        return cls._dispatchers[model_provider]
+
+    @staticmethod
+    def _create_client(model_provider: ModelType, base_url: str, api_key: Optional[str] = None):
+        http_settings = settings.vector.http
+        http2 = http_settings.http2
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.warning("HTTP/2 requires the 'h2' package (pip install httpx[http2]), fallback to HTTP/1.1")
+            http2 = False
+        limits = httpx.Limits(
+            max_connections=http_settings.max_connections,
+            max_keepalive_connections=http_settings.max_keepalive_connections,
+            keepalive_expiry=http_settings.keepalive_expiry
+        )
+        match model_provider:
+            case ModelType.OPENAI:
+                import openai
+                # 重试由 AdaptiveDispatcher 统一处理
+                return openai.AsyncClient(
+                    base_url=base_url,
+                    api_key=api_key,
+                    max_retries=0,
+                    http_client=openai.DefaultAsyncHttpxClient(limits=limits, http2=http2)
+                )
+            case ModelType.JINA:
+                return jina.AsyncClient(base_url=base_url, api_key=api_key, limits=limits, http2=http2)
+
+    @classmethod
+    async def close(cls):
+        clients, cls._clients = list(cls._clients.values()), {}
+        cls._endpoint_pools = {}
+        embedders, cls._local_embedders = list(cls._local_embedders.values()), {}
+        for embedder in embedders:
+            embedder.close()
+        for client in clients:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                await client.close()
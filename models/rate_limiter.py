@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : rate_limiter
+# @Software: PyCharm
+import asyncio
+import email.utils
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+
+import httpx
+from loguru import logger
+
+from setting.setting import RateLimitSettings
+
+T = TypeVar('T')
+
+# RPM / TPM 的统计窗口（秒）
+WINDOW_SECONDS = 60
+# 两次并发下调之间的最小间隔，避免同一波失败把并发连续减半
+DECREASE_COOLDOWN = 1.0
+DECREASE_FACTOR = 0.5
+BACKOFF_BASE = 1.0
+
+
+def _parse_retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    if response is None:
+        return None
+    retry_after_ms = response.headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = response.headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time()) if retry_at else None
+
+
+def classify_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """返回 (是否可重试, Retry-After 秒数)，429、5xx、超时和连接错误可以重试"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code, response = error.response.status_code, error.response
+    else:
+        # openai.APIStatusError 带有 status_code 和 response
+        status_code, response = getattr(error, 'status_code', None), getattr(error, 'response', None)
+    if status_code is not None:
+        if status_code == 429 or status_code >= 500:
+            return True, _parse_retry_after(response)
+        return False, None
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True, None
+    # openai.APIConnectionError / APITimeoutError
+    if type(error).__name__ in ('APIConnectionError', 'APITimeoutError'):
+        return True, None
+    return False, None
+
+
+class AdaptiveDispatcher:
+    """
+    按提供商限制嵌入请求：
+    - AIMD 自适应并发：成功时并发缓慢增加，遇到 429 / 5xx / 超时时减半
+    - 60 秒滑动窗口内的 RPM / TPM 预算，请求结束后按响应中的实际 token 用量修正
+    - 可重试的错误按 Retry-After 或带抖动的指数退避重试，Retry-After 期间暂停所有请求
+    """
+
+    def __init__(self, name: str, limit_settings: RateLimitSettings):
+        self.name = name
+        self.settings = limit_settings
+        self.limit = float(limit_settings.initial_concurrency)
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        # [timestamp, tokens]
+        self._window: Deque[List[float]] = deque()
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    async def run(
+            self,
+            call: Callable[[], Awaitable[T]],
+            tokens: int,
+            usage: Optional[Callable[[T], Optional[int]]] = None
+    ) -> T:
+        """
+        call 为实际的请求，tokens 为预估的 token 数，usage 从响应中读取实际用量
+        """
+        attempt = 0
+        while True:
+            record = await self._acquire(tokens)
+            # None 表示不调整并发（成功以外的不可重试错误或被取消）
+            overloaded = None
+            try:
+                result = await call()
+                overloaded = False
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                if not retryable or attempt >= self.settings.max_retries:
+                    overloaded = True if retryable else None
+                    raise
+                overloaded, error = True, e
+            finally:
+                await self._release(overloaded)
+            if not overloaded:
+                actual_tokens = usage(result) if usage else None
+                if actual_tokens is not None and record[0] > time.monotonic() - WINDOW_SECONDS:
+                    self._window_tokens += actual_tokens - record[1]
+                    record[1] = actual_tokens
+                return result
+            if retry_after is not None:
+                delay = min(retry_after, self.settings.max_backoff)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            else:
+                delay = random.uniform(0, min(self.settings.max_backoff, BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            logger.warning(
+                f"{self.name} embedding request failed ({type(error).__name__}: {error}), "
+                f"retry {attempt}/{self.settings.max_retries} in {delay:.1f}s, concurrency {int(self.limit)}"
+            )
+            await asyncio.sleep(delay)
+
+    def _expire(self, now: float):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    async def _acquire(self, tokens: int) -> List[float]:
+        rpm, tpm = self.settings.rpm, self.settings.tpm
+        async with self._condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= int(self.limit):
+                    wait = None
+                elif rpm and len(self._window) >= rpm:
+                    wait = self._window[0][0] + WINDOW_SECONDS - now
+                elif tpm and self._window and self._window_tokens + tokens > tpm:
+                    wait = self._window[0][0] + WINDOW_SECONDS - now
+                else:
+                    self._in_flight += 1
+                    record = [now, tokens]
+                    self._window.append(record)
+                    self._window_tokens += tokens
+                    return record
+                try:
+                    await asyncio.wait_for(self._condition.wait(), wait)
+                except TimeoutError:
+                    pass
+
+    async def _release(self, overloaded: Optional[bool]):
+        async with self._condition:
+            self._in_flight -= 1
+            if overloaded is None:
+                pass
+            elif overloaded:
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self._last_decrease = now
+                    self.limit = max(float(self.settings.min_concurrency), self.limit * DECREASE_FACTOR)
+            else:
+                # 每个窗口（约等于当前并发数个请求）增加 1
+                self.limit = min(float(self.settings.max_concurrency), self.limit + 1 / self.limit)
+            self._condition.notify_all()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : file_filter
+# @Software: PyCharm
+import posixpath
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from setting.setting import We0IndexSettings, get_we0_index_settings
+from utils.path_matcher import PathMatcher
+
+settings: We0IndexSettings = get_we0_index_settings()
+
+GITIGNORE = '.gitignore'
+GITATTRIBUTES = '.gitattributes'
+
+# 依赖锁文件，内容是机器生成的版本清单，没有检索价值
+LOCKFILE_NAMES = frozenset({
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'bun.lockb',
+    'Cargo.lock', 'Gemfile.lock', 'composer.lock', 'poetry.lock', 'Pipfile.lock', 'pdm.lock', 'uv.lock',
+    'go.sum', 'mix.lock', 'pubspec.lock', 'Podfile.lock', 'packages.lock.json', 'flake.lock',
+})
+# 压缩/打包产物与 source map
+MINIFIED_SUFFIXES = ('.min.js', '.min.mjs', '.min.css', '-min.js', '-min.css', '.bundle.js', '.js.map', '.css.map')
+
+# .gitattributes 中表示生成文件、第三方代码或二进制文件的属性
+EXCLUDE_ATTRIBUTES = frozenset({'linguist-generated', 'linguist-vendored', '-diff'})
+
+REASON_IGNORED = 'gitignore'
+REASON_ATTRIBUTE = 'gitattributes'
+REASON_TOO_LARGE = 'too-large'
+REASON_LOCKFILE = 'lockfile'
+REASON_MINIFIED = 'minified'
+REASON_BINARY = 'binary'
+# 由文件内容决定的原因，可以按 blob SHA 缓存
+CONTENT_REASONS = frozenset({REASON_BINARY, REASON_MINIFIED})
+
+
+def content_filter_key() -> str:
+    """sniff 判断结果依赖的阈值，作为负缓存键的一部分，阈值调整后旧结果不再命中"""
+    filter_settings = settings.pipeline.filter
+    return f'sniff-bytes={filter_settings.sniff_bytes};max-avg-line-length={filter_settings.max_avg_line_length}'
+
+
+def _parse_attributes(content: str, base_dir: str) -> List[Tuple[PathMatcher, Dict[str, bool]]]:
+    """
+    解析 .gitattributes，返回 [(路径匹配, {属性: 是否排除})]
+    只关心 EXCLUDE_ATTRIBUTES，`binary` 宏等价于 `-diff`
+    """
+    rules = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        pattern, *attributes = line.split()
+        values = {}
+        for attribute in attributes:
+            if attribute in ('binary', '-diff'):
+                values['-diff'] = True
+            elif attribute == 'diff' or attribute.startswith('diff='):
+                values['-diff'] = False
+            elif attribute.startswith(('-', '!')) and attribute[1:] in EXCLUDE_ATTRIBUTES:
+                values[attribute[1:]] = False
+            else:
+                name, _, value = attribute.partition('=')
+                if name in EXCLUDE_ATTRIBUTES:
+                    values[name] = value.lower() not in ('false', '0')
+        if values:
+            rules.append((PathMatcher([pattern], base_dir), values))
+    return rules
+
+
+class FileFilter:
+    """
+    读取文件内容之前的过滤：.gitignore、.gitattributes（linguist-generated / linguist-vendored / -diff）、
+    文件大小、锁文件与压缩文件的文件名规则，以及已知不可索引 blob 的负缓存；
+    读取之后由 sniff 检查前几 KB 中的 NUL 字节和平均行长度，避免二进制与压缩文件进入分段和嵌入
+    """
+
+    def __init__(
+            self,
+            ignore_matchers: Optional[List[PathMatcher]] = None,
+            attribute_rules: Optional[List[Tuple[PathMatcher, Dict[str, bool]]]] = None,
+            non_indexable: Optional[Dict[str, str]] = None
+    ):
+        # 由深到浅，子目录中的 .gitignore 优先
+        self.ignore_matchers = sorted(
+            ignore_matchers or [],
+            key=lambda matcher: len(matcher.base_dir.split('/')) if matcher.base_dir else 0,
+            reverse=True
+        )
+        self.attribute_rules = attribute_rules or []
+        # {blob_sha: reason}
+        self.non_indexable = non_indexable or {}
+        self.max_file_bytes = settings.pipeline.filter.max_file_kb * 1024
+
+    @classmethod
+    async def from_tree(
+            cls,
+            paths: Iterable[Tuple[str, str]],
+            read: Callable[[str], Awaitable[bytes]],
+            non_indexable: Optional[Dict[str, str]] = None
+    ) -> 'FileFilter':
+        """
+        paths 为提交中全部文件的 (relative_path, blob_sha)，读取其中的 .gitignore 和 .gitattributes
+        """
+        ignore_matchers, attribute_rules = [], []
+        # 按目录深度排序，保证 .gitattributes 由浅到深应用
+        for relative_path, blob_sha in sorted(paths, key=lambda item: item[0].count('/')):
+            directory, name = posixpath.split(relative_path)
+            if name not in (GITIGNORE, GITATTRIBUTES):
+                continue
+            content = (await read(blob_sha)).decode('utf-8', 'replace')
+            if name == GITIGNORE:
+                ignore_matchers.append(PathMatcher.from_lines(content, directory))
+            else:
+                attribute_rules.extend(_parse_attributes(content, directory))
+        return cls(ignore_matchers, attribute_rules, non_indexable)
+
+    def check(self, relative_path: str, size: Optional[int] = None, blob_sha: Optional[str] = None) -> Optional[str]:
+        """返回跳过原因，可以索引时返回 None"""
+        if blob_sha and blob_sha in self.non_indexable:
+            return self.non_indexable[blob_sha]
+        if size is not None and size > self.max_file_bytes:
+            return REASON_TOO_LARGE
+        name = posixpath.basename(relative_path)
+        if name in LOCKFILE_NAMES:
+            return REASON_LOCKFILE
+        if name.endswith(MINIFIED_SUFFIXES):
+            return REASON_MINIFIED
+        for matcher in self.ignore_matchers:
+            ignored = matcher.decide(relative_path)
+            if ignored is not None:
+                if ignored:
+                    return REASON_IGNORED
+                break
+        if self.attribute_rules:
+            values = {}
+            for matcher, rule_values in self.attribute_rules:
+                if matcher.decide(relative_path, match_parents=False):
+                    values.update(rule_values)
+            if any(values.values()):
+                return REASON_ATTRIBUTE
+        return None
+
+    def sniff(self, data: bytes | str) -> Optional[str]:
+        """检查已读取的内容，返回跳过原因，可以索引时返回 None"""
+        filter_settings = settings.pipeline.filter
+        if len(data) > self.max_file_bytes:
+            return REASON_TOO_LARGE
+        head = data[:filter_settings.sniff_bytes]
+        newline, nul = ('\n', '\0') if isinstance(data, str) else (b'\n', b'\0')
+        # 与 git 判断二进制文件的方式相同
+        if nul in head:
+            return REASON_BINARY
+        # 压缩后的代码几乎没有换行，内容过短时不做判断
+        if len(head) >= 4 * filter_settings.max_avg_line_length and \
+                len(head) / (head.count(newline) + 1) > filter_settings.max_avg_line_length:
+            return REASON_MINIFIED
+        return None
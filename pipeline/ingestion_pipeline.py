@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : ingestion_pipeline
+# @Software: PyCharm
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from domain.entity.blob import Blob
+from domain.entity.document import Document
+from domain.entity.task_context import TaskContext
+from domain.response.add_index_response import FileInfoResponse
+from extensions.ext_manager import ExtManager
+from pipeline.file_filter import CONTENT_REASONS, FileFilter
+from setting.setting import StageSettings, We0IndexSettings, get_we0_index_settings
+from utils.mimetype_util import guess_mimetype_and_extension
+from utils.vector_helper import VectorHelper
+
+settings: We0IndexSettings = get_we0_index_settings()
+
+# 队列结束标记
+_STOP = object()
+
+
+@dataclass
+class IngestSource:
+    """待索引的文件，read 在读取阶段才会被调用，避免提前把所有文件读入内存"""
+    file_id: str
+    relative_path: str
+    read: Callable[[], Awaitable[bytes | str]]
+    # 已知的文件大小与 blob SHA（Git 仓库），用于读取前过滤
+    size: Optional[int] = None
+    blob_sha: Optional[str] = None
+
+
+@dataclass
+class IngestStats:
+    discovered: int = 0
+    skipped: int = 0
+    read: int = 0
+    segmented: int = 0
+    embedded: int = 0
+    written: int = 0
+
+
+@dataclass
+class _FileDocuments:
+    file_id: str
+    relative_path: str
+    documents: List[Document] = field(default_factory=list)
+
+
+class IngestionPipeline:
+    """
+    分阶段的索引流水线：enumerate -> read -> segment -> embed -> write
+    每个阶段有独立的有界队列和 worker 数量，内存占用只和队列容量相关，与仓库大小无关；
+    分段（CPU，线程池）与嵌入、写入（网络）相互重叠
+    """
+
+    def __init__(
+            self,
+            repo_id: str,
+            prune_empty: bool = False,
+            file_filter: Optional[FileFilter] = None,
+            stats: Optional[IngestStats] = None,
+            on_written: Optional[Callable[[str], Awaitable[Any]]] = None
+    ):
+        self.repo_id = repo_id
+        # 文件不再产生任何分段或被过滤时删除旧向量（增量索引）
+        self.prune_empty = prune_empty
+        # 不传时不做过滤，调用方显式上传的文件全部索引；仓库级的过滤只用于 git 索引
+        self.file_filter = file_filter
+        # 调用方传入时可以在运行过程中读取进度
+        self.stats = stats or IngestStats()
+        # 文件的向量写入（或清理）完成后以 relative_path 回调，用于记录检查点
+        self.on_written = on_written
+        self.file_infos: List[FileInfoResponse] = []
+        self.skipped_file_ids: List[str] = []
+        # 本次读取后才发现不可索引的 blob {blob_sha: reason}，由调用方写入负缓存
+        self.non_indexable: Dict[str, str] = {}
+
+    async def run(self, sources: AsyncIterable[IngestSource] | Iterable[IngestSource]) -> List[FileInfoResponse]:
+        pipeline = settings.pipeline
+        read_queue = asyncio.Queue(maxsize=pipeline.read.queue_size)
+        segment_queue = asyncio.Queue(maxsize=pipeline.segment.queue_size)
+        embed_queue = asyncio.Queue(maxsize=pipeline.embed.queue_size)
+        write_queue = asyncio.Queue(maxsize=pipeline.write.queue_size)
+
+        tasks = [
+            asyncio.create_task(self._enumerate(sources, read_queue, pipeline.read.workers)),
+            *self._stage(self._read, read_queue, pipeline.read, segment_queue, pipeline.segment.workers),
+            *self._stage(self._segment, segment_queue, pipeline.segment, embed_queue, pipeline.embed.workers),
+            *self._stage(self._embed, embed_queue, pipeline.embed, write_queue, pipeline.write.workers),
+            *self._stage(self._write, write_queue, pipeline.write),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self.prune_empty and self.skipped_file_ids:
+            await ExtManager.vector.delete(self.repo_id, self.skipped_file_ids)
+        return self.file_infos
+
+    @staticmethod
+    def _stage(
+            handler: Callable[[Any], Awaitable[Any]],
+            in_queue: asyncio.Queue,
+            stage_settings: StageSettings,
+            out_queue: asyncio.Queue | None = None,
+            out_workers: int = 0
+    ) -> List[asyncio.Task]:
+        remaining = stage_settings.workers
+
+        async def worker():
+            nonlocal remaining
+            while (item := await in_queue.get()) is not _STOP:
+                result = await handler(item)
+                # handler 返回 None 表示该文件被过滤
+                if out_queue is not None and result is not None:
+                    await out_queue.put(result)
+            remaining -= 1
+            # 本阶段最后一个 worker 退出时通知下游所有 worker 结束
+            if remaining == 0:
+                for _ in range(out_workers):
+                    await out_queue.put(_STOP)
+
+        return [asyncio.create_task(worker()) for _ in range(stage_settings.workers)]
+
+    async def _enumerate(
+            self, sources: AsyncIterable[IngestSource] | Iterable[IngestSource], read_queue: asyncio.Queue, read_workers: int
+    ):
+        if isinstance(sources, AsyncIterable):
+            async for source in sources:
+                await self._discover(source, read_queue)
+        else:
+            for source in sources:
+                await self._discover(source, read_queue)
+        for _ in range(read_workers):
+            await read_queue.put(_STOP)
+
+    async def _discover(self, source: IngestSource, read_queue: asyncio.Queue):
+        self.stats.discovered += 1
+        reason = self.file_filter and self.file_filter.check(source.relative_path, source.size, source.blob_sha)
+        if reason:
+            self._skip(source, reason)
+        else:
+            await read_queue.put(source)
+
+    def _skip(self, source: IngestSource, reason: str):
+        logger.debug(f'Skip file {source.relative_path}: {reason}')
+        self.stats.skipped += 1
+        self.skipped_file_ids.append(source.file_id)
+
+    async def _read(self, source: IngestSource) -> Optional[TaskContext]:
+        mimetype, extension = guess_mimetype_and_extension(source.relative_path)
+        data = await source.read()
+        self.stats.read += 1
+        reason = self.file_filter and self.file_filter.sniff(data)
+        if reason:
+            if source.blob_sha and reason in CONTENT_REASONS:
+                self.non_indexable[source.blob_sha] = reason
+            self._skip(source, reason)
+            return None
+        return TaskContext(
+            repo_id=self.repo_id,
+            file_id=source.file_id,
+            relative_path=source.relative_path,
+            blob=Blob.from_data(
+                data=data,
+                mimetype=mimetype,
+                extension=extension
+            )
+        )
+
+    async def _segment(self, task_context: TaskContext) -> _FileDocuments:
+        logger.info(f'Processing file {task_context.relative_path}')
+        documents = await asyncio.to_thread(VectorHelper.build_segment, task_context)
+        self.stats.segmented += 1
+        return _FileDocuments(
+            file_id=task_context.file_id,
+            relative_path=task_context.relative_path,
+            documents=documents
+        )
+
+    async def _embed(self, file_documents: _FileDocuments) -> _FileDocuments:
+        if file_documents.documents:
+            await VectorHelper.embedding_documents(file_documents.documents)
+        self.stats.embedded += 1
+        return file_documents
+
+    async def _write(self, file_documents: _FileDocuments):
+        if file_documents.documents:
+            await ExtManager.vector.upsert(file_documents.documents)
+        elif self.prune_empty:
+            await ExtManager.vector.delete(self.repo_id, [file_documents.file_id])
+        if self.on_written:
+            await self.on_written(file_documents.relative_path)
+        self.stats.written += 1
+        self.file_infos.append(
+            FileInfoResponse(file_id=file_documents.file_id, relative_path=file_documents.relative_path)
+        )
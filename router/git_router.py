@@ -1,63 +1,100 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import asyncio
-import os
-from typing import List, Optional
+import functools
+import json
+import posixpath
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 from urllib.parse import quote
 
 import aiofiles
 from fastapi import APIRouter
-from git import Repo
+from fastapi.responses import StreamingResponse
+from git import Repo, GitCommandError
 from loguru import logger
 
-from domain.entity.blob import Blob
-from domain.entity.document import Document
-from domain.entity.task_context import TaskContext
 from domain.request.git_index_request import GitIndexRequest
-from domain.response.add_index_response import AddIndexResponse, FileInfoResponse
+from domain.request.index_job_request import IndexJobRequest
+from domain.response.add_index_response import AddIndexResponse
+from domain.response.index_job_response import IndexJobResponse
 from domain.result.result import Result
 from extensions.ext_manager import ExtManager
+from extensions.git.object_reader import GitObjectReader, list_tree, prefetch_blobs
+from extensions.job.job_manager import PROGRESS_FLUSH_INTERVAL
+from pipeline.file_filter import FileFilter, GITATTRIBUTES, GITIGNORE, content_filter_key
+from pipeline.ingestion_pipeline import IngestionPipeline, IngestSource, IngestStats
 from setting.setting import get_we0_index_settings
 from utils.git_parse import parse_git_url
 from utils.helper import Helper
-from utils.mimetype_util import guess_mimetype_and_extension
-from utils.vector_helper import VectorHelper
-from asyncio import Semaphore
+from utils.path_matcher import PathMatcher
+
 git_router = APIRouter()
 settings = get_we0_index_settings()
-async_semaphore = Semaphore(100)
-
-async def _process_file(uid: str, repo_id: str, repo_path: str, base_dir, relative_path: str) -> FileInfoResponse:
-    logger.info(f'Processing file {relative_path}')
-    mimetype, extension = guess_mimetype_and_extension(relative_path)
-    file_id = Helper.generate_fixed_uuid(f"{uid}:{repo_path}:{relative_path}")
-    file_path = os.path.join(base_dir, relative_path)
-    async with aiofiles.open(file_path, 'rb') as f:
-        content = await f.read()
-
-    task_context = TaskContext(
-        repo_id=repo_id,
-        file_id=file_id,
-        relative_path=relative_path,
-        blob=Blob.from_data(
-            data=content,
-            mimetype=mimetype,
-            extension=extension
-        )
-    )
 
+# 修改后需要全量重新过滤的规则文件
+FILTER_RULE_FILES = (GITIGNORE, GITATTRIBUTES)
+
+
+def _is_indexable_path(relative_path: str) -> bool:
+    """忽略隐藏目录（如 .git）和隐藏文件"""
+    return not any(part.startswith('.') for part in relative_path.split('/'))
+
+
+def _diff_commits(
+        repo: Repo, old_commit: str, new_commit: str, fetch_missing: bool = False
+) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    根据 `git diff --name-status` 计算两次提交之间的变更
+    返回 (需要重新索引的文件, 需要删除向量的文件)，由调用方按索引范围过滤；
+    旧提交在仓库中不存在时（如 force push 改写了历史）返回 None，由调用方回退为全量索引
+    浅克隆/部分克隆（fetch_missing）会先尝试单独拉取旧提交，diff 只需要两侧的 tree
+    """
     try:
-        async with async_semaphore:
-            documents: List[Document] = await VectorHelper.build_and_embedding_segment(task_context)
-            if documents:
-                await ExtManager.vector.upsert(documents)
-    except Exception as e:
-        raise e
+        repo.git.cat_file('-e', f'{old_commit}^{{commit}}')
+    except GitCommandError:
+        if not fetch_missing:
+            return None
+        try:
+            repo.git.fetch('--depth=1', '--filter=blob:none', 'origin', old_commit)
+        except GitCommandError:
+            return None
+    # 重命名等价于删除旧路径并新增新路径，关闭重命名检测可避免在部分克隆中拉取文件内容
+    output = repo.git.diff('--name-status', '--no-renames', '-z', old_commit, new_commit)
+    tokens = output.split('\0')
+    changed_paths, deleted_paths = [], []
+    for index in range(0, len(tokens) - 1, 2):
+        status, path = tokens[index], tokens[index + 1]
+        if status.startswith('D'):
+            deleted_paths.append(path)
+        else:
+            # A(dded) M(odified) T(ype changed)
+            changed_paths.append(path)
+    return changed_paths, deleted_paths
 
-    return FileInfoResponse(
-        file_id=file_id,
-        relative_path=relative_path
-    )
+
+@asynccontextmanager
+async def _open_repo(git_index_request: GitIndexRequest, mirror_key: str, auth_repo_url: str) -> AsyncIterator[Repo]:
+    """
+    打开待索引的 bare 仓库，文件内容直接从对象库读取，不检出工作区
+    默认使用镜像缓存；指定 depth 或 blobless 时直接浅克隆/部分克隆到临时目录
+    """
+    if git_index_request.depth or git_index_request.blobless:
+        async with aiofiles.tempfile.TemporaryDirectory() as tmp_dir:
+            clone_kwargs = {'bare': True}
+            if git_index_request.depth:
+                clone_kwargs['depth'] = git_index_request.depth
+            if git_index_request.blobless:
+                clone_kwargs['filter'] = 'blob:none'
+            try:
+                git_repo: Repo = await asyncio.to_thread(Repo.clone_from, auth_repo_url, tmp_dir, **clone_kwargs)
+            except Exception as e:
+                logger.error(f'{type(e).__name__}: {e}')
+                raise e
+            yield git_repo
+    else:
+        async with ExtManager.mirror_store.acquire(mirror_key, auth_repo_url, git_index_request.repo_url) as mirror:
+            yield mirror
 
 
 def _prepare_repo_url_with_auth(repo_url: str, username: Optional[str] = None, password: Optional[str] = None,
@@ -88,6 +125,171 @@ def _prepare_repo_url_with_auth(repo_url: str, username: Optional[str] = None, p
     return repo_url
 
 
+async def _delete_paths(uid: str, repo_abs_path: str, repo_id: str, relative_paths: Iterable[str]):
+    """删除指定文件的向量"""
+    file_ids = [
+        Helper.generate_fixed_uuid(f"{uid}:{repo_abs_path}:{relative_path}") for relative_path in relative_paths
+    ]
+    if file_ids:
+        await ExtManager.vector.delete(repo_id=repo_id, file_ids=file_ids)
+
+
+def _resolve_repo(git_index_request: GitIndexRequest) -> Tuple[str, str, str]:
+    """返回 (repo_abs_path, repo_id, mirror_key)"""
+    if not git_index_request.uid:
+        git_index_request.uid = 'default_uid'
+    domain, owner, repo = parse_git_url(git_index_request.repo_url)
+    repo_abs_path = f'{domain}/{owner}/{repo}'
+    repo_id = Helper.generate_fixed_uuid(f"{git_index_request.uid}{repo_abs_path}:")
+    # 无法解析的仓库地址（如自建 Git 服务）按 URL 哈希作为镜像键
+    mirror_key = repo_abs_path if domain else f'_/{Helper.generate_text_hash(git_index_request.repo_url)}'
+    return repo_abs_path, repo_id, mirror_key
+
+
+async def _index_repository(git_index_request: GitIndexRequest, stats: IngestStats) -> str:
+    """克隆并索引仓库，stats 实时记录进度，返回结果说明"""
+    repo_abs_path, repo_id, mirror_key = _resolve_repo(git_index_request)
+
+    # 准备认证后的仓库 URL
+    auth_repo_url = _prepare_repo_url_with_auth(
+        git_index_request.repo_url,
+        git_index_request.username,
+        git_index_request.password,
+        git_index_request.access_token
+    )
+
+    # 索引范围，范围变化时不能基于上次的提交做增量索引；
+    # 嵌入模型或维度变化后向量写入新的集合，集合也属于索引范围
+    scope = json.dumps(
+        {'collection': ExtManager.vector.collection, 'sparse_paths': sorted(git_index_request.sparse_paths or [])},
+        sort_keys=True
+    )
+    sparse_matcher = PathMatcher(git_index_request.sparse_paths) if git_index_request.sparse_paths else None
+
+    def _in_scope(relative_path: str) -> bool:
+        return _is_indexable_path(relative_path) and (sparse_matcher is None or sparse_matcher.match(relative_path))
+
+    async with _open_repo(git_index_request, mirror_key, auth_repo_url) as git_repo:
+        git_dir = git_repo.git_dir
+        head_commit = git_repo.head.commit.hexsha
+
+        changes = None
+        last_commit = None
+        # 曾经索引过的仓库在全量索引时也需要清理旧向量
+        last_index = await ExtManager.state.commit_store.get(repo_id)
+        if last_index and not git_index_request.full_index:
+            last_commit, last_scope = last_index
+            if last_scope != scope:
+                logger.info(f"Index scope or collection of {repo_abs_path} changed, fallback to full index")
+                last_commit = None
+        if last_commit == head_commit:
+            logger.info(f"Repository {repo_abs_path} is already indexed at {head_commit}")
+            return f"Already indexed at {head_commit}"
+        if last_commit:
+            changes = await asyncio.to_thread(
+                _diff_commits, git_repo, last_commit, head_commit,
+                bool(git_index_request.depth or git_index_request.blobless)
+            )
+            if changes is None:
+                logger.warning(f"Commit {last_commit} not found in {repo_abs_path}, fallback to full index")
+
+        # ls-tree 只返回普通文件，子模块和符号链接不会被索引
+        tree_entries = await list_tree(git_dir, head_commit)
+        rule_entries = [entry for entry in tree_entries if posixpath.basename(entry.path) in FILTER_RULE_FILES]
+        if changes is not None and any(
+                posixpath.basename(path) in FILTER_RULE_FILES for path in changes[0] + changes[1]
+        ):
+            # 过滤规则变化会影响未修改的文件，全量索引前仍需清理已删除文件的旧向量
+            logger.info(f"Filter rules of {repo_abs_path} changed, fallback to full index")
+            await _delete_paths(git_index_request.uid, repo_abs_path, repo_id, filter(_in_scope, changes[1]))
+            changes = None
+        entries = [entry for entry in tree_entries if _in_scope(entry.path)]
+        if changes is not None:
+            changed_paths, deleted_paths = changes
+            changed_paths = set(changed_paths)
+            entries = [entry for entry in entries if entry.path in changed_paths]
+            deleted_paths = [deleted_path for deleted_path in deleted_paths if _in_scope(deleted_path)]
+            await _delete_paths(git_index_request.uid, repo_abs_path, repo_id, deleted_paths)
+            logger.info(
+                f"Incremental index {repo_abs_path} {last_commit[:8]}..{head_commit[:8]}: "
+                f"{len(entries)} changed, {len(deleted_paths)} deleted"
+            )
+
+        # 跳过上次中断前已经写入的文件，其他提交或索引范围的检查点已经失效
+        checkpoint_store = ExtManager.state.checkpoint_store
+        await checkpoint_store.delete(repo_id, keep=(head_commit, scope))
+        written_paths = await checkpoint_store.get_paths(repo_id, head_commit, scope)
+        if written_paths:
+            entries = [entry for entry in entries if entry.path not in written_paths]
+            logger.info(
+                f"Resume indexing {repo_abs_path} at {head_commit[:8]}, {len(written_paths)} files already written"
+            )
+
+        # 读取 .gitignore / .gitattributes 构建过滤器，已知不可索引的 blob 不再读取
+        if git_index_request.blobless:
+            await prefetch_blobs(git_dir, [entry.sha for entry in rule_entries])
+        filter_key = content_filter_key()
+        non_indexable = await ExtManager.state.blob_filter_store.get_many({entry.sha for entry in entries}, filter_key)
+        async with GitObjectReader(git_dir) as reader:
+            file_filter = await FileFilter.from_tree(
+                [(entry.path, entry.sha) for entry in rule_entries], reader.read, non_indexable
+            )
+        if git_index_request.blobless:
+            # 部分克隆只拉取通过过滤的文件内容
+            await prefetch_blobs(
+                git_dir,
+                [entry.sha for entry in entries if file_filter.check(entry.path, entry.size, entry.sha) is None]
+            )
+
+        # 遍历并处理文件，曾经索引过的仓库需要清理被过滤文件的旧向量
+        async with GitObjectReader(git_dir) as reader:
+            pipeline = IngestionPipeline(
+                repo_id,
+                prune_empty=last_index is not None,
+                file_filter=file_filter,
+                stats=stats,
+                on_written=functools.partial(checkpoint_store.add, repo_id, head_commit, scope)
+            )
+            await pipeline.run(
+                IngestSource(
+                    file_id=Helper.generate_fixed_uuid(f"{git_index_request.uid}:{repo_abs_path}:{entry.path}"),
+                    relative_path=entry.path,
+                    read=functools.partial(reader.read, entry.sha),
+                    size=entry.size,
+                    blob_sha=entry.sha
+                ) for entry in entries
+            )
+        await ExtManager.state.blob_filter_store.add_many(pipeline.non_indexable, filter_key)
+        logger.info(f"Skipped {stats.skipped} non-indexable files from repository {repo_abs_path}")
+
+        if changes is None and last_index is not None:
+            # 全量重建时清理已不在当前提交（或索引范围）中的文件
+            file_ids = {
+                Helper.generate_fixed_uuid(f"{git_index_request.uid}:{repo_abs_path}:{entry.path}")
+                for entry in tree_entries if _in_scope(entry.path)
+            }
+            stale_file_ids = list({meta.file_id for meta in await ExtManager.vector.all_meta(repo_id)} - file_ids)
+            if stale_file_ids:
+                await ExtManager.vector.delete(repo_id=repo_id, file_ids=stale_file_ids)
+            logger.info(f"Pruned {len(stale_file_ids)} stale files from repository {repo_abs_path}")
+
+        await ExtManager.state.commit_store.set(repo_id, head_commit, scope)
+        await checkpoint_store.delete(repo_id)
+        logger.info(f"Successfully processed {stats.written} files from repository {repo_abs_path}")
+    return f"Indexed {stats.written} files at {head_commit}, skipped {stats.skipped}"
+
+
+def _dedupe_key(git_index_request: GitIndexRequest, repo_id: str) -> str:
+    """相同仓库和索引参数的提交视为同一个任务，认证信息不参与计算"""
+    options = git_index_request.model_dump(exclude={'username', 'password', 'access_token'})
+    return Helper.generate_text_hash(f"{repo_id}:{json.dumps(options, sort_keys=True)}")
+
+
+async def _get_job(job_id: str) -> Optional[IndexJobResponse]:
+    job = await ExtManager.job_manager.get(job_id)
+    return IndexJobResponse(**job) if job else None
+
+
 async def clone_and_index(git_index_request: GitIndexRequest) -> Result[AddIndexResponse]:
     """
     Tool parameters must be in standard JSON format!
@@ -101,54 +303,8 @@ async def clone_and_index(git_index_request: GitIndexRequest) -> Result[AddIndex
     - HTTPS + 用户名密码: 提供 username 和 password 参数
     """
     try:
-        if not git_index_request.uid:
-            git_index_request.uid = 'default_uid'
-
-        domain, owner, repo = parse_git_url(git_index_request.repo_url)
-        repo_abs_path = f'{domain}/{owner}/{repo}'
-        repo_id = Helper.generate_fixed_uuid(f"{git_index_request.uid}{repo_abs_path}:")
-
-        # 准备认证后的仓库 URL
-        auth_repo_url = _prepare_repo_url_with_auth(
-            git_index_request.repo_url,
-            git_index_request.username,
-            git_index_request.password,
-            git_index_request.access_token
-        )
-
-        file_count = 0  # 初始化 file_count 变量
-
-        async with aiofiles.tempfile.TemporaryDirectory() as tmp_dir:
-            try:
-                await asyncio.to_thread(
-                    Repo.clone_from,
-                    auth_repo_url,
-                    tmp_dir
-                )
-            except Exception as e:
-                logger.error(f'{type(e).__name__}: {e}')
-                raise e
-            # 遍历并处理文件
-            tasks = []
-            for root, dirs, files in os.walk(tmp_dir):
-                # 忽略 .git 等隐藏目录
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
-                for file in files:
-                    if not file.startswith('.'):
-                        relative_path = os.path.relpath(os.path.join(root, file), start=tmp_dir)
-                        tasks.append(asyncio.create_task(_process_file(
-                            uid=git_index_request.uid,
-                            repo_id=repo_id,
-                            repo_path=repo_abs_path,
-                            base_dir=tmp_dir,
-                            relative_path=relative_path
-                        )))
-            for task in asyncio.as_completed(tasks):
-                await task
-                file_count += 1
-
-            logger.info(f"Successfully processed {file_count} files from repository {repo_abs_path}")
-
+        _, repo_id, _ = _resolve_repo(git_index_request)
+        await _index_repository(git_index_request, IngestStats())
         return Result.ok(data=AddIndexResponse(
             repo_id=repo_id,
             file_infos=[]
@@ -158,4 +314,80 @@ async def clone_and_index(git_index_request: GitIndexRequest) -> Result[AddIndex
         return Result.failed(message=f"{type(e).__name__}: {e}")
 
 
+async def submit_index_job(git_index_request: GitIndexRequest) -> Result[IndexJobResponse]:
+    """
+    Tool parameters must be in standard JSON format!
+    "git_index_request": {
+        "xxx": "xxx"
+    }
+    提交后台索引任务（参数同 clone_and_index），立即返回任务 ID，通过 get_index_job 查询进度
+    相同仓库和参数的任务未结束时，重复提交返回同一个任务
+    """
+    try:
+        _, repo_id, _ = _resolve_repo(git_index_request)
+        stats = IngestStats()
+        job_id = await ExtManager.job_manager.submit(
+            repo_id=repo_id,
+            dedupe_key=_dedupe_key(git_index_request, repo_id),
+            progress=stats,
+            run=functools.partial(_index_repository, git_index_request, stats)
+        )
+        return Result.ok(data=await _get_job(job_id))
+    except Exception as e:
+        logger.exception(e)
+        return Result.failed(message=f"{type(e).__name__}: {e}")
+
+
+async def get_index_job(index_job_request: IndexJobRequest) -> Result[IndexJobResponse]:
+    """
+    Tool parameters must be in standard JSON format!
+    "index_job_request": {
+        "job_id": "xxx"
+    }
+    查询索引任务的状态与进度（discovered / skipped / read / segmented / embedded / written）
+    """
+    job = await _get_job(index_job_request.job_id)
+    if job is None:
+        return Result.failed(code=404, message=f"Index job {index_job_request.job_id} not found")
+    return Result.ok(data=job)
+
+
+async def cancel_index_job(index_job_request: IndexJobRequest) -> Result[IndexJobResponse]:
+    """
+    Tool parameters must be in standard JSON format!
+    "index_job_request": {
+        "job_id": "xxx"
+    }
+    取消运行中的索引任务，已写入的向量会保留
+    """
+    cancelled = await ExtManager.job_manager.cancel(index_job_request.job_id)
+    job = await _get_job(index_job_request.job_id)
+    if job is None:
+        return Result.failed(code=404, message=f"Index job {index_job_request.job_id} not found")
+    if not cancelled:
+        return Result.failed(code=409, message=f"Index job {index_job_request.job_id} is already {job.status}")
+    return Result.ok(data=job)
+
+
+async def index_job_events(job_id: str) -> StreamingResponse:
+    """以 SSE 推送索引任务的状态与进度，任务结束后关闭连接"""
+
+    async def _events() -> AsyncIterator[str]:
+        while True:
+            job = await _get_job(job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'message': f'Index job {job_id} not found'})}\n\n"
+                return
+            yield f"data: {job.model_dump_json()}\n\n"
+            if job.status.finished:
+                return
+            await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+
+    return StreamingResponse(_events(), media_type='text/event-stream')
+
+
 git_router.add_api_route('/clone_and_index', clone_and_index, methods=['POST'], response_model=Result[AddIndexResponse])
+git_router.add_api_route('/submit_index_job', submit_index_job, methods=['POST'], response_model=Result[IndexJobResponse])
+git_router.add_api_route('/get_index_job', get_index_job, methods=['POST'], response_model=Result[IndexJobResponse])
+git_router.add_api_route('/cancel_index_job', cancel_index_job, methods=['POST'], response_model=Result[IndexJobResponse])
+git_router.add_api_route('/index_job_events/{job_id}', index_job_events, methods=['GET'])
@@ -5,7 +5,7 @@
 # @Email   : amashiro2233@gmail.com
 # @File    : vector_router
 # @Software: PyCharm
-import asyncio
+import functools
 from typing import Annotated
 from typing import List
 
@@ -21,10 +21,11 @@ from domain.request.delete_index_request import DeleteIndexRequest
 from domain.request.drop_index_request import DropIndexRequest
 from domain.request.retrieval_request import RetrievalRequest
 from domain.response.add_index_by_file_response import AddIndexByFileResponse
-from domain.response.add_index_response import AddIndexResponse, FileInfoResponse
+from domain.response.add_index_response import AddIndexResponse
 from domain.result.result import Result
 from extensions.ext_manager import ExtManager
 from models.model_factory import ModelInstance
+from pipeline.ingestion_pipeline import IngestionPipeline, IngestSource
 from setting.setting import get_we0_index_settings
 from utils.helper import Helper
 from utils.mimetype_util import guess_mimetype_and_extension
@@ -35,32 +36,8 @@ vector_router = APIRouter()
 settings = get_we0_index_settings()
 
 
-async def _upsert_index(uid: str, repo_abs_path: str, repo_id: str, file_info: AddFileInfo) -> FileInfoResponse:
-    mimetype, extension = guess_mimetype_and_extension(file_info.relative_path)
-    file_id = Helper.generate_fixed_uuid(
-        f"{uid}:{repo_abs_path}:{file_info.relative_path}"
-    )
-
-    task_context = TaskContext(
-        repo_id=repo_id,
-        file_id=file_id,
-        relative_path=file_info.relative_path,
-        blob=Blob.from_data(
-            data=file_info.content,
-            mimetype=mimetype,
-            extension=extension
-        )
-    )
-    try:
-        documents: List[Document] = await VectorHelper.build_and_embedding_segment(task_context)
-        if documents:
-            await ExtManager.vector.upsert(documents)
-    except Exception as e:
-        raise e
-    return FileInfoResponse(
-        file_id=file_id,
-        relative_path=file_info.relative_path
-    )
+async def _read_content(file_info: AddFileInfo) -> str:
+    return file_info.content
 
 
 @vector_router.post("/upsert_index", response_model=Result[AddIndexResponse])
@@ -72,15 +49,15 @@ async def upsert_index(add_index_request: AddIndexRequest):
     """
     repo_id = Helper.generate_fixed_uuid(f"{add_index_request.uid}:{add_index_request.repo_abs_path}")
 
-    tasks = [
-        asyncio.create_task(_upsert_index(
-            uid=add_index_request.uid,
-            repo_abs_path=add_index_request.repo_abs_path,
-            repo_id=repo_id,
-            file_info=file_info
-        )) for file_info in add_index_request.file_infos
-    ]
-    file_infos = [await task for task in asyncio.as_completed(tasks)]
+    file_infos = await IngestionPipeline(repo_id).run(
+        IngestSource(
+            file_id=Helper.generate_fixed_uuid(
+                f"{add_index_request.uid}:{add_index_request.repo_abs_path}:{file_info.relative_path}"
+            ),
+            relative_path=file_info.relative_path,
+            read=functools.partial(_read_content, file_info)
+        ) for file_info in add_index_request.file_infos
+    )
     return Result.ok(data=AddIndexResponse(repo_id=repo_id, file_infos=file_infos))
 
 
@@ -127,6 +104,9 @@ async def drop_index(drop_index_request: DropIndexRequest):
     """
     try:
         await ExtManager.vector.drop(repo_id=drop_index_request.repo_id)
+        # 向量已全部删除，下次 Git 索引需要全量重建
+        await ExtManager.state.commit_store.delete(drop_index_request.repo_id)
+        await ExtManager.state.checkpoint_store.delete(drop_index_request.repo_id)
         return Result.ok()
     except Exception as e:
         return Result.failed(message=f"{type(e).__name__}: {e}")
@@ -7,7 +7,7 @@
 # @Software: PyCharm
 import os.path
 from functools import lru_cache
-from typing import Type
+from typing import Dict, List, Literal, Optional, Type
 
 from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict, PydanticBaseSettingsSource, YamlConfigSettingsSource
@@ -96,13 +96,78 @@ class ChromaSettings(BaseSettings):
         return self
 
 
+class HttpClientSettings(BaseModel):
+    max_connections: int = Field(default=100, ge=1, alias='max-connections')
+    max_keepalive_connections: int = Field(default=20, ge=0, alias='max-keepalive-connections')
+    keepalive_expiry: float = Field(default=60, ge=0, alias='keepalive-expiry')
+    http2: bool = Field(default=False)
+
+
+class EmbeddingBatchSettings(BaseModel):
+    max_items: int = Field(default=512, ge=1, alias='max-items')
+    max_tokens: int = Field(default=100000, ge=1, alias='max-tokens')
+    max_wait_ms: int = Field(default=50, ge=0, alias='max-wait-ms')
+
+
+class EmbeddingRequestSettings(BaseModel):
+    max_items: int = Field(default=2048, ge=1, alias='max-items')
+    max_tokens: int = Field(default=250000, ge=1, alias='max-tokens')
+
+
+class LocalEmbeddingSettings(BaseModel):
+    # 未配置时使用 embedding-model 作为模型目录
+    model_path: Optional[str] = Field(default=None, alias='model-path')
+    backend: Literal['auto', 'onnx', 'sentence-transformers'] = Field(default='auto')
+    # 未配置时等于 CPU 核数
+    workers: Optional[int] = Field(default=None, ge=1)
+    batch_size: int = Field(default=32, ge=1, alias='batch-size')
+    max_length: int = Field(default=512, ge=1, alias='max-length')
+    hash_dimension: int = Field(default=256, ge=1, alias='hash-dimension')
+
+
+class EmbeddingEndpointSettings(BaseModel):
+    base_url: str = Field(alias='base-url')
+    api_key: Optional[str] = Field(default=None, alias='api-key')
+
+
+class EndpointPoolSettings(BaseModel):
+    # 为空时使用提供商默认地址（OPENAI_BASE_URL / JINA_BASE_URL）
+    endpoints: List[EmbeddingEndpointSettings] = Field(default_factory=list)
+    failure_threshold: int = Field(default=5, ge=1, alias='failure-threshold')
+    reset_timeout: float = Field(default=30, gt=0, alias='reset-timeout')
+    hedging: bool = Field(default=False)
+    hedge_percentile: float = Field(default=0.95, gt=0, le=1, alias='hedge-percentile')
+    hedge_min_samples: int = Field(default=20, ge=1, alias='hedge-min-samples')
+    hedge_min_delay_ms: int = Field(default=20, ge=0, alias='hedge-min-delay-ms')
+
+
+class RateLimitSettings(BaseModel):
+    rpm: Optional[int] = Field(default=None, ge=1)
+    tpm: Optional[int] = Field(default=None, ge=1)
+    initial_concurrency: int = Field(default=8, ge=1, alias='initial-concurrency')
+    min_concurrency: int = Field(default=1, ge=1, alias='min-concurrency')
+    max_concurrency: int = Field(default=64, ge=1, alias='max-concurrency')
+    max_retries: int = Field(default=6, ge=0, alias='max-retries')
+    max_backoff: float = Field(default=60, gt=0, alias='max-backoff')
+
+
 class VectorSettings(BaseSettings):
     platform: VectorType
     code2desc: bool = Field(default=False)
+    # 是否计算代码段的 o200k_base token 数（需要再编码一次）
+    o200k_tokens: bool = Field(default=True, alias='o200k-tokens')
     chat_provider: ModelType = Field(default='openai', alias='chat-provider')
     chat_model: str = Field(default='gpt-4o-mini', alias='chat-model')
     embedding_provider: ModelType = Field(default='openai', alias='embedding-provider')
     embedding_model: str = Field(default='text-embedding-3-small', alias='embedding-model')
+    embedding_batch: EmbeddingBatchSettings = Field(default_factory=EmbeddingBatchSettings, alias='embedding-batch')
+    embedding_request: EmbeddingRequestSettings = Field(
+        default_factory=EmbeddingRequestSettings, alias='embedding-request'
+    )
+    embedding_pool: EndpointPoolSettings = Field(default_factory=EndpointPoolSettings, alias='embedding-pool')
+    local_embedding: LocalEmbeddingSettings = Field(default_factory=LocalEmbeddingSettings, alias='local-embedding')
+    http: HttpClientSettings = Field(default_factory=HttpClientSettings)
+    rate_limits: Dict[ModelType, RateLimitSettings] = Field(default_factory=dict, alias='rate-limits')
     pgvector: PGVectorSettings | None
     qdrant: QdrantSettings | None
     chroma: ChromaSettings | None
@@ -114,11 +179,71 @@ class VectorSettings(BaseSettings):
         return self
 
 
+class EmbeddingCacheSettings(BaseModel):
+    enabled: bool = Field(default=True)
+    path: str = Field(default=Constants.Path.EMBEDDING_CACHE_DEFAULT_PATH)
+    max_disk_mb: int = Field(default=2048, ge=1, alias='max-disk-mb')
+
+    @model_validator(mode='before')
+    def handle_path(self):
+        if self.get('path') and not os.path.isabs(self['path']):
+            self['path'] = os.path.join(Constants.Path.ROOT_PATH, self['path'])
+        return self
+
+
+class StateSettings(BaseModel):
+    path: str = Field(default=Constants.Path.STATE_DEFAULT_PATH)
+    embedding_cache: EmbeddingCacheSettings = Field(default_factory=EmbeddingCacheSettings, alias='embedding-cache')
+
+    @model_validator(mode='before')
+    def handle_path(self):
+        if self.get('path') and not os.path.isabs(self['path']):
+            self['path'] = os.path.join(Constants.Path.ROOT_PATH, self['path'])
+        return self
+
+
+class GitMirrorSettings(BaseModel):
+    path: str = Field(default=Constants.Path.MIRROR_DEFAULT_PATH)
+    max_disk_mb: int = Field(default=10240, alias='max-disk-mb')
+
+    @model_validator(mode='before')
+    def handle_path(self):
+        if self.get('path') and not os.path.isabs(self['path']):
+            self['path'] = os.path.join(Constants.Path.ROOT_PATH, self['path'])
+        return self
+
+
+class GitSettings(BaseModel):
+    mirror: GitMirrorSettings = Field(default_factory=GitMirrorSettings)
+
+
+class StageSettings(BaseModel):
+    workers: int = Field(default=4, ge=1)
+    queue_size: int = Field(default=64, ge=1, alias='queue-size')
+
+
+class FilterSettings(BaseModel):
+    max_file_kb: int = Field(default=1024, ge=1, alias='max-file-kb')
+    sniff_bytes: int = Field(default=8000, ge=1, alias='sniff-bytes')
+    max_avg_line_length: int = Field(default=300, ge=1, alias='max-avg-line-length')
+
+
+class PipelineSettings(BaseModel):
+    filter: FilterSettings = Field(default_factory=FilterSettings)
+    read: StageSettings = Field(default_factory=lambda: StageSettings(workers=16))
+    segment: StageSettings = Field(default_factory=lambda: StageSettings(workers=4))
+    embed: StageSettings = Field(default_factory=lambda: StageSettings(workers=64))
+    write: StageSettings = Field(default_factory=lambda: StageSettings(workers=4))
+
+
 class We0IndexSettings(BaseModel):
     application: str
     log: LogSettings
     server: ServerSettings
     vector: VectorSettings
+    state: StateSettings = Field(default_factory=StateSettings)
+    git: GitSettings = Field(default_factory=GitSettings)
+    pipeline: PipelineSettings = Field(default_factory=PipelineSettings)
 
 
 class AppSettings(BaseSettings):
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : test_line_based_segmenter
+# @Software: PyCharm
+"""
+LineBasedSegmenter 线性化改写前后的兼容性测试：
+fixtures/line_based_segments.json 中的分块由改写前的实现生成，改写后的分块必须完全一致
+"""
+import itertools
+import json
+import os
+import string
+from functools import lru_cache
+from typing import Any, Dict, List
+
+import pytest
+import tiktoken
+
+from loader.segmenter.base_line_segmenter import LineBasedSegmenter
+from loader.segmenter.token_index import TokenIndex
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'line_based_segments.json')
+
+
+@lru_cache(maxsize=None)
+def build_encoding() -> tiktoken.Encoding:
+    """不依赖网络下载词表的小型 BPE 编码：单字节 + 字母/空格两两组合"""
+    ranks = {bytes([i]): i for i in range(256)}
+    for pair in itertools.product(string.ascii_letters + ' _', repeat=2):
+        ranks[''.join(pair).encode()] = len(ranks)
+    pat_str = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+    return tiktoken.Encoding('test_bpe', pat_str=pat_str, mergeable_ranks=ranks, special_tokens={})
+
+
+def run_segmenter(segmenter_cls: type, text: str, case: Dict[str, Any]) -> List[List[Any]]:
+    """按用例参数分块，返回 [start, end, code, block, tokens]"""
+    encoding = build_encoding()
+    token_index = TokenIndex(text, encoding) if case['token_index'] else None
+    segmenter = segmenter_cls(
+        text,
+        length_function=lambda chunk: len(encoding.encode(chunk)),
+        token_index=token_index,
+        **case['kwargs']
+    )
+    return [
+        [segment.start, segment.end, segment.code, segment.block, segment.tokens]
+        for segment in segmenter.segment()
+    ]
+
+
+def _load_fixture() -> Dict[str, Any]:
+    """{"texts": {文本名: 文本}, "cases": [{"name", "text", "token_index", "kwargs", "segments"}]}"""
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+FIXTURE = _load_fixture()
+
+
+@pytest.mark.parametrize('case', FIXTURE['cases'], ids=lambda case: case['name'])
+def test_segments_match_previous_implementation(case: Dict[str, Any]):
+    text = FIXTURE['texts'][case['text']]
+    assert run_segmenter(LineBasedSegmenter, text, case) == case['segments']
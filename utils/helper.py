@@ -8,7 +8,7 @@
 
 import uuid
 from hashlib import sha256
-from typing import Optional, Literal, Union, Collection
+from typing import List, Optional, Literal, Union, Collection
 
 import tiktoken
 
@@ -62,6 +62,25 @@ class Helper:
         Helper._encoders_cache[cache_key] = _tiktoken_encoder
         return _tiktoken_encoder(text)
 
+    @staticmethod
+    def calculate_tokens_batch(
+            texts: List[str],
+            encoding_name: str = "cl100k_base",
+            allowed_special=None,
+            disallowed_special: Union[Literal["all"], Collection[str]] = "all",
+    ) -> List[int]:
+        """
+        计算一批文本的 token 数量。调用方已经运行在分段的线程池中，这里逐条编码，
+        不使用 encode_batch（每次调用都会新建一个线程池）
+        """
+        if allowed_special is None:
+            allowed_special = set()
+        enc = tiktoken.get_encoding(encoding_name)
+        return [
+            len(enc.encode(text, allowed_special=allowed_special, disallowed_special=disallowed_special))
+            for text in texts
+        ]
+
     @staticmethod
     def generate_fixed_uuid(unique_str: str) -> str:
         namespace = uuid.NAMESPACE_URL
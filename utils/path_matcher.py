@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/18
+# @Author  : .*?
+# @Email   : amashiro2233@gmail.com
+# @File    : path_matcher
+# @Software: PyCharm
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+
+class PathMatcher:
+    """
+    gitignore 语法的路径匹配（同样适用于 non-cone 模式的 sparse-checkout 和 .gitattributes 的路径部分）
+    规则按顺序匹配，最后一条命中的规则生效；父目录命中后其下所有文件都视为命中
+    """
+
+    def __init__(self, patterns: Iterable[str], base_dir: str = ''):
+        self.base_dir = base_dir.strip('/')
+        self.rules: List[Tuple[Pattern, bool, bool]] = []
+        for pattern in patterns:
+            rule = self._compile(pattern)
+            if rule:
+                self.rules.append(rule)
+
+    @classmethod
+    def from_lines(cls, content: str, base_dir: str = '') -> 'PathMatcher':
+        return cls(content.splitlines(), base_dir)
+
+    @staticmethod
+    def _compile(pattern: str) -> Optional[Tuple[Pattern, bool, bool]]:
+        pattern = pattern.rstrip('\r')
+        if not pattern.strip() or pattern.startswith('#'):
+            return None
+        # 行尾未转义的空格会被忽略
+        pattern = re.sub(r'(?<!\\) +$', '', pattern)
+        negate = pattern.startswith('!')
+        if negate:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\'):
+            pattern = pattern[1:]
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if not pattern:
+            return None
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        regex = ''
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if pattern.startswith('**/', index) and (index == 0 or pattern[index - 1] == '/'):
+                regex += '(?:.*/)?'
+                index += 3
+            elif pattern.startswith('**', index) and index + 2 == len(pattern) and (
+                    index == 0 or pattern[index - 1] == '/'):
+                regex += '.*'
+                index += 2
+            elif char == '*':
+                regex += '[^/]*'
+                index += 1
+            elif char == '?':
+                regex += '[^/]'
+                index += 1
+            elif char == '[':
+                end = pattern.find(']', index + 2)
+                if end == -1:
+                    regex += re.escape(char)
+                    index += 1
+                else:
+                    group = pattern[index + 1:end].replace('\\', '\\\\')
+                    if group.startswith('!'):
+                        group = '^' + group[1:]
+                    regex += '[' + group + ']'
+                    index = end + 1
+            elif char == '\\' and index + 1 < len(pattern):
+                regex += re.escape(pattern[index + 1])
+                index += 2
+            else:
+                regex += re.escape(char)
+                index += 1
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        return re.compile(regex + '$', re.DOTALL), negate, dir_only
+
+    def _match_rules(self, path: str, is_dir: bool) -> Optional[bool]:
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                result = not negate
+        return result
+
+    def decide(self, path: str, match_parents: bool = True) -> Optional[bool]:
+        """
+        path 为相对仓库根目录、以 / 分隔的文件路径；没有任何规则命中时返回 None
+        match_parents=False 时规则只匹配文件本身（.gitattributes 的语义）
+        """
+        if self.base_dir:
+            if not path.startswith(self.base_dir + '/'):
+                return None
+            path = path[len(self.base_dir) + 1:]
+        if match_parents:
+            parts = path.split('/')
+            for index in range(1, len(parts)):
+                if self._match_rules('/'.join(parts[:index]), is_dir=True):
+                    return True
+        return self._match_rules(path, is_dir=False)
+
+    def match(self, path: str) -> bool:
+        """path 为相对仓库根目录、以 / 分隔的文件路径"""
+        if not self.rules:
+            return False
+        return bool(self.decide(path))
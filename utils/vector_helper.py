@@ -9,6 +9,7 @@ import asyncio
 import uuid
 from typing import List
 
+import numpy as np
 from fastapi import APIRouter
 from loguru import logger
 
@@ -34,28 +35,79 @@ class VectorHelper:
         )
 
     @staticmethod
-    async def build_and_embedding_segment(task_context: TaskContext) -> List[Document]:
+    def build_segment(task_context: TaskContext) -> List[Document]:
+        """分段并构建文档（同步，CPU 密集）"""
         try:
-            documents: List[Document] = [
-                Document(
-                    content=segment.code,
-                    meta=DocumentMeta(
-                        repo_id=task_context.repo_id,
-                        file_id=task_context.file_id,
-                        segment_id=f"{uuid.uuid4()}",
-                        relative_path=task_context.relative_path,
-                        start_line=segment.start,
-                        end_line=segment.end,
-                        segment_block=segment.block,
-                        segment_hash=Helper.generate_text_hash(segment.code),
-                        segment_cl100k_base_token=Helper.calculate_tokens(segment.code),
-                        segment_o200k_base_token=Helper.calculate_tokens(segment.code, 'o200k_base')
-                    )
-                ) async for segment in RepoLoader.load_blob(task_context.blob)
-            ]
+            segments = list(RepoLoader.load_segments(task_context.blob))
         except UnicodeDecodeError as e:
             logger.error(e)
-            documents = []
+            return []
+        codes = [segment.code for segment in segments]
+        # cl100k_base 的 token 数通常在分段时已由文件的 token 索引得到，其余的与 o200k_base 一起批量编码
+        missing = [index for index, segment in enumerate(segments) if segment.tokens is None]
+        cl100k_tokens = [segment.tokens for segment in segments]
+        for index, tokens in zip(missing, Helper.calculate_tokens_batch([codes[index] for index in missing])):
+            cl100k_tokens[index] = tokens
+        if settings.vector.o200k_tokens:
+            o200k_tokens = Helper.calculate_tokens_batch(codes, 'o200k_base')
+        else:
+            o200k_tokens = [None] * len(segments)
+        return [
+            Document(
+                content=segment.code,
+                meta=DocumentMeta(
+                    repo_id=task_context.repo_id,
+                    file_id=task_context.file_id,
+                    segment_id=f"{uuid.uuid4()}",
+                    relative_path=task_context.relative_path,
+                    start_line=segment.start,
+                    end_line=segment.end,
+                    segment_block=segment.block,
+                    segment_hash=Helper.generate_text_hash(segment.code),
+                    segment_cl100k_base_token=cl100k_tokens[index],
+                    segment_o200k_base_token=o200k_tokens[index]
+                )
+            ) for index, segment in enumerate(segments)
+        ]
+
+    @staticmethod
+    async def create_embedding(embedding_model: ModelInstance, texts: List[str], tokens: List[int]) -> np.ndarray:
+        """
+        先查询嵌入缓存，只对未命中的文本调用嵌入模型，返回与 texts 顺序一致的 float32 矩阵
+        tokens 为各文本的 cl100k_base token 数，用于合批和请求切分
+        """
+        embedding_cache = ExtManager.state.embedding_cache
+        if embedding_cache is None:
+            return np.stack(await embedding_model.create_embedding_batched(texts, tokens))
+        text_hashes = [Helper.generate_text_hash(text) for text in texts]
+        provider, model = embedding_model.model_type, embedding_model.model_name
+        cached = await embedding_cache.get_many(provider, model, text_hashes)
+        missing = {
+            text_hash: (text, text_tokens)
+            for text_hash, text, text_tokens in zip(text_hashes, texts, tokens) if text_hash not in cached
+        }
+        if missing:
+            missing_texts, missing_tokens = zip(*missing.values())
+            vectors = await embedding_model.create_embedding_batched(list(missing_texts), list(missing_tokens))
+            created = dict(zip(missing.keys(), vectors))
+            await embedding_cache.put_many(provider, model, created)
+            cached.update(created)
+        return np.stack([cached[text_hash] for text_hash in text_hashes])
+
+    @staticmethod
+    def _embedding_tokens(prefixes: List[str], documents: List[Document]) -> List[int]:
+        """嵌入文本为 前缀 + 代码段，代码段的 cl100k_base token 数在分段时已经得到，只需再计算前缀"""
+        return [
+            prefix_tokens + (
+                document.meta.segment_cl100k_base_token
+                if document.meta.segment_cl100k_base_token is not None
+                else Helper.calculate_tokens(document.content)
+            )
+            for prefix_tokens, document in zip(Helper.calculate_tokens_batch(prefixes), documents)
+        ]
+
+    @staticmethod
+    async def embedding_documents(documents: List[Document]) -> List[Document]:
         if documents:
             embedding_model: ModelInstance = await ExtManager.vector.get_embedding_model()
             if settings.vector.code2desc:
@@ -64,18 +116,23 @@ class VectorHelper:
                     asyncio.create_task(VectorHelper.code2description(document=document, chat_model=chat_model))
                     for document in documents
                 ])
-                vector_data: List[List[float]] = await embedding_model.create_embedding(
-                    [
-                        f"'{document.meta.relative_path}'\n'{document.meta.description}'\n{document.content}"
-                        for document in documents
-                    ]
-                )
+                prefixes = [
+                    f"'{document.meta.relative_path}'\n'{document.meta.description}'\n" for document in documents
+                ]
             else:
-                vector_data: List[List[float]] = await embedding_model.create_embedding(
-                    [
-                        f"'{document.meta.relative_path}'\n{document.content}" for document in documents
-                    ]
-                )
-            for index, document in enumerate(documents):
-                document.vector = vector_data[index]
+                prefixes = [f"'{document.meta.relative_path}'\n" for document in documents]
+            tokens = await asyncio.to_thread(VectorHelper._embedding_tokens, prefixes, documents)
+            vector_data: np.ndarray = await VectorHelper.create_embedding(
+                embedding_model,
+                [prefix + document.content for prefix, document in zip(prefixes, documents)],
+                tokens
+            )
+            # 各文档的向量是同一矩阵的行视图
+            for document, vector in zip(documents, vector_data):
+                document.vector = vector
         return documents
+
+    @staticmethod
+    async def build_and_embedding_segment(task_context: TaskContext) -> List[Document]:
+        documents: List[Document] = await asyncio.to_thread(VectorHelper.build_segment, task_context)
+        return await VectorHelper.embedding_documents(documents)